@@ -1,77 +1,319 @@
 # -*- coding: utf-8 -*-
 """Calculation function to add hydrogen to a structure based on the potential."""
 
-from skimage.feature.peak import peak_local_max
 import numpy as np
 
 from aiida.engine import calcfunction
 from aiida import orm
 
+from aiida_hydrogen_restorer.utils.basins import (
+    distribute_hydrogens, get_basin_positions, get_basin_properties, get_basins, select_basins
+)
+from aiida_hydrogen_restorer.utils.hydrogen_sites import get_hydrogen_sites
+from aiida_hydrogen_restorer.utils.peaks import (
+    MIN_DISTANCE, filter_equivalent_peaks, find_peaks, get_gap_threshold, update_peaks
+)
+from aiida_hydrogen_restorer.utils.potential import add_protons_to_potential, smooth_potential
+from aiida_hydrogen_restorer.utils.structure import count_hydrogens, get_structure_summary
+from aiida_hydrogen_restorer.utils.symmetry import get_orbits
+
+# Minimum distance in Angstrom between a new hydrogen and the existing sites, as for `validate_proximity` of pymatgen
+PROXIMITY_TOLERANCE = 0.5
+
+# Standard deviation in Angstrom of the Gaussian charge of the protons added to the potential by the predictor
+PREDICTOR_WIDTH = 0.5
+
+# Minimum distance in Angstrom between two hydrogens placed in the same basin of the potential
+HYDROGEN_SEPARATION = 1.5
+
+# Maximum distance in Angstrom over which a new hydrogen is moved onto a geometric hydrogen site
+SNAP_DISTANCE = 0.8
+
+
+def place_hydrogens(structure, positions, max_number, tolerance=PROXIMITY_TOLERANCE):
+    """Append hydrogens to a pymatgen structure at the given fractional positions, in order.
+
+    Positions closer than `tolerance` to an existing site, including the hydrogens placed before, are skipped.
+
+    :return: the number of hydrogens that were placed.
+    """
+    placed = 0
+
+    for position in positions:
+        if placed == max_number:
+            break
+        if structure.lattice.get_all_distances(position, structure.frac_coords).min() < tolerance:
+            continue
+        structure.append('H', position)
+        placed += 1
+
+    return placed
+
+
+def is_far_from_sites(structure, positions, tolerance=PROXIMITY_TOLERANCE):
+    """Return whether each of the fractional `positions` is at least `tolerance` away from the sites of a structure."""
+    if len(positions) == 0:
+        return np.zeros(0, dtype=bool)
+
+    return structure.lattice.get_all_distances(positions, structure.frac_coords).min(axis=1) >= tolerance
+
+
+def place_hydrogens_on_peaks(
+    structure, all_peak_locations, all_peak_values, shape, equiv_peak_threshold, missing_H,
+    tolerances=(PROXIMITY_TOLERANCE,)
+):
+    """Append hydrogens to a pymatgen structure on the equivalent highest peaks of the potential.
+
+    If all equivalent peaks are closer than the first of the `tolerances` to an existing site, a single hydrogen is
+    placed on the next-ranked peaks instead, trying each of the `tolerances` in turn. No hydrogen is placed if there
+    are more equivalent peaks than missing hydrogens.
+
+    If no hydrogen is placed, only the equivalent peaks that are at least the last of the `tolerances` away from the
+    existing sites are returned, since they are the candidates of a combinatorial search such as pinball.
+
+    :return: tuple with the grid indices and values of the equivalent peaks, and whether no hydrogen could be placed
+        because all the peaks are too close to an existing site.
+    """
+    peak_locations, peak_values = filter_equivalent_peaks(all_peak_locations, all_peak_values, equiv_peak_threshold)
+    proximity_blocked = False
+
+    if len(peak_values) <= missing_H:
+        if place_hydrogens(structure, np.divide(peak_locations, shape), missing_H, tolerances[0]) > 0:
+            return peak_locations, peak_values, False
+
+        other_positions = np.divide(all_peak_locations[len(peak_values):], shape)
+        for tolerance in tolerances:
+            if place_hydrogens(structure, other_positions, 1, tolerance) > 0:
+                return peak_locations, peak_values, False
+        proximity_blocked = True
+
+    free = is_far_from_sites(structure, np.divide(peak_locations, shape), tolerances[-1])
+
+    return peak_locations[free], peak_values[free], proximity_blocked or not free.any()
+
+
+def snap_to_hydrogen_sites(structure, number_sites, sites, max_distance=SNAP_DISTANCE):
+    """Move each hydrogen appended after the first `number_sites` sites onto the nearest free geometric site.
+
+    Only the geometric sites within `max_distance` are considered, see
+    `aiida_hydrogen_restorer.utils.hydrogen_sites.get_hydrogen_sites`.
+    """
+    if len(sites) == 0:
+        return
+
+    used = set()
+
+    for index in range(number_sites, len(structure)):
+        distances = structure.lattice.get_all_distances(structure[index].frac_coords, sites)[0]
+        for site_index in np.argsort(distances):
+            if distances[site_index] > max_distance:
+                break
+            if site_index not in used:
+                used.add(site_index)
+                structure.replace(index, 'H', sites[site_index])
+                break
+
+
+def get_auto_threshold(structure, all_peak_locations, all_peak_values, shape, missing_H):
+    """Return the equivalence threshold at the largest gap in the peak values that respects the symmetry orbits.
+
+    Only the highest peaks are grouped in orbits, since the cut can keep at most `missing_H` of them, see
+    `aiida_hydrogen_restorer.utils.peaks.get_gap_threshold`.
+    """
+    number = min(len(all_peak_values), 2 * missing_H + 2)
+    orbits = get_orbits(structure, np.divide(all_peak_locations[:number], shape))
+
+    return get_gap_threshold(all_peak_values[:number], orbits, missing_H)
+
+
+def place_hydrogens_in_basins(structure, potential, all_peak_locations, all_peak_values, basin_depth_ratio, missing_H):
+    """Append hydrogens to a pymatgen structure in the watershed basins of the peaks of the potential.
+
+    The number of hydrogens that go in each basin is decided from its depth and integrated value, see
+    `aiida_hydrogen_restorer.utils.basins.distribute_hydrogens`.
+
+    If more basins are selected than hydrogens are missing, no hydrogen is placed, and the selected basins are
+    returned as candidates for a combinatorial search such as pinball.
+
+    :return: tuple with the grid indices and values of the peaks of the selected basins, and the dictionary with the
+        `volumes`, `depths`, `integrals`, number of `hydrogens` and whether they are `selected` of all basins.
+    """
+    if len(all_peak_locations) == 0:
+        return all_peak_locations, all_peak_values, {}
+
+    basins = get_basins(potential, all_peak_locations)
+    properties = get_basin_properties(
+        potential, basins, len(all_peak_locations), structure.lattice.volume / potential.size
+    )
+    properties['hydrogens'] = distribute_hydrogens(
+        properties['depths'], properties['integrals'], missing_H, basin_depth_ratio
+    )
+    properties['selected'] = select_basins(properties['depths'], basin_depth_ratio)
+
+    for index in np.flatnonzero(properties['hydrogens']):
+        positions = get_basin_positions(
+            potential, basins, index + 1, properties['hydrogens'][index], structure.lattice, HYDROGEN_SEPARATION
+        )
+        place_hydrogens(structure, positions, len(positions))
+
+    selected = properties['selected']
+
+    return all_peak_locations[selected], all_peak_values[selected], properties
+
+
 @calcfunction
 def add_hydrogens_to_structure(
     structure_data: orm.StructureData,
     potential_array: orm.ArrayData,
     do_supercell: orm.Bool, 
     equiv_peak_threshold: orm.Float,
-    num_H: orm.Int
+    num_H: orm.Int,
+    previous_potential: orm.ArrayData = None,
+    previous_peaks: orm.ArrayData = None,
+    change_tolerance: orm.Float = None,
+    predictor_rounds: orm.Int = None,
+    smoothing_width: orm.Float = None,
+    basin_depth_ratio: orm.Float = None,
+    auto_threshold: orm.Bool = None,
+    geometric_sites: orm.Bool = None,
+    proximity_tolerances: orm.List = None,
     ) -> dict:
-    """Add hydrogen atoms to a structure based on its calculated potential."""
+    """Add hydrogen atoms to a structure based on its calculated potential.
 
-    def find_peaks(potential, do_supercell, equiv_peak_threshold):
-        if do_supercell:
-                  # We search for peaks in a 3x3x3 supercell to find also peaks close to a cell edge
-            supercell_size = (3,3,3)
-            supercell_potential = np.tile(potential, supercell_size) 
-            peak_locations = peak_local_max(supercell_potential, min_distance=3, exclude_border=False)
+    If the potential and the `all_peaks` output of the previous iteration are passed, together with a
+    `change_tolerance`, the peaks of the previous iteration are updated instead of searching the whole grid again, see
+    `aiida_hydrogen_restorer.utils.peaks.update_peaks`.
 
-            supercell_mask = (np.floor_divide(peak_locations, potential.shape) == np.array([1,1,1])).all(axis=1)
-            peak_locations = peak_locations[supercell_mask, :]
-           
-            peak_locations_orig = np.remainder(peak_locations, potential.shape)
+    If `predictor_rounds` is larger than one, the hydrogens are placed in several rounds: after each round the potential
+    of the new protons is subtracted from the grid, see `aiida_hydrogen_restorer.utils.potential`, and the next
+    hydrogens are placed on the peaks of the updated potential. The `all_peaks` output always refers to the peaks of the
+    input potential.
 
-        else:
-            peak_locations_orig = peak_local_max(potential, min_distance=1, exclude_border=False)
+    If a `smoothing_width` in Angstrom is passed, the potentials are smoothed with a periodic Gaussian of that width
+    before the peak search, which removes the spurious maxima due to the numerical noise of the grid.
 
-        peak_values_orig = potential[tuple(peak_locations_orig.T)]
+    If a `basin_depth_ratio` is passed, the potential is segmented in the watershed basins of its peaks, and the
+    hydrogens are placed in the basins with a depth of at least that ratio of the deepest one, several per basin if its
+    integrated value allows, instead of on the peaks within `equiv_peak_threshold` of the highest one.
 
-        #To check if the maxima are sorted:
-        assert np.allclose(peak_values_orig, sorted(peak_values_orig)[::-1]), "Peak values are not sorted!"
-        num_orig_peaks = len(peak_values_orig)
+    If `auto_threshold` is True, the `equiv_peak_threshold` is ignored and chosen instead at the largest gap in the
+    sorted peak values that does not split a symmetry orbit, see `get_auto_threshold`. The chosen threshold is stored
+    in the `equiv_peak_threshold` array of the `all_peaks` output.
 
-        # Filter down only to largest equivalent peaks, within a threshold 
-        
-        equiv_peak_mask = peak_values_orig > peak_values_orig[0] * equiv_peak_threshold   
-        peak_locations = peak_locations_orig[equiv_peak_mask]
-        peak_values = peak_values_orig[equiv_peak_mask]  #equiv_peak_mask 
+    If `geometric_sites` is True, the hydrogens placed on the peaks are cross-checked against the sites proposed by the
+    bonding geometry of the structure, and moved onto the nearest one within `SNAP_DISTANCE`.
 
-        return peak_locations, peak_values#, peak_locations_orig, peak_values_orig
+    If all the peaks are closer than `PROXIMITY_TOLERANCE` to an existing site, no hydrogen is placed and the
+    `proximity_blocked` array of the `all_peaks` output is True. Smaller distances are only tried if they are passed
+    explicitly in `proximity_tolerances`, in order. If no hydrogen is placed, the `peak_positions` and `peak_values`
+    only contain the peaks far enough from the existing sites, see `place_hydrogens_on_peaks`.
+    """
 
-    new_structure = structure_data.get_pymatgen()
+    structure = structure_data.get_pymatgen()
+    new_structure = structure.copy()
+    summary = get_structure_summary(structure_data)
     potential = potential_array.get_array('data')
 
-    #Now I want to apply the above function to the data = look for maxima
-    peak_locations, peak_values = find_peaks(
-        potential, do_supercell.value, equiv_peak_threshold.value
-    ) 
-    if (len(peak_values) > (num_H.value - int(new_structure.composition['H']))):
-        print("Equivalent maxima are more than desired atoms, please change method.")
-        pass
+    if smoothing_width is not None:
+        potential = smooth_potential(potential, new_structure.lattice.matrix, smoothing_width.value)
 
+    if previous_potential is not None and previous_peaks is not None and change_tolerance is not None:
+        previous_potential = previous_potential.get_array('data')
+        if smoothing_width is not None and previous_potential.shape == potential.shape:
+            previous_potential = smooth_potential(previous_potential, new_structure.lattice.matrix, smoothing_width.value)
+
+        all_peak_locations, all_peak_values = update_peaks(
+            potential,
+            previous_potential,
+            previous_peaks.get_array('all_peak_locations'),
+            change_tolerance.value,
+            MIN_DISTANCE if do_supercell.value else 1,
+            do_supercell.value,
+        )
     else:
-        for scaled_pos in np.divide(peak_locations, potential.shape):
+        all_peak_locations, all_peak_values = find_peaks(potential, do_supercell.value)
 
-            if int(new_structure.composition['H']) == num_H.value:
-                break
+    missing_H = num_H.value - count_hydrogens(structure_data)
+    basin_properties = {}
+    threshold = equiv_peak_threshold.value
+    tolerances = tuple(proximity_tolerances.get_list()) if proximity_tolerances is not None else (PROXIMITY_TOLERANCE,)
+    proximity_blocked = False
+
+    if basin_depth_ratio is not None:
+        peak_locations, peak_values, basin_properties = place_hydrogens_in_basins(
+            new_structure, potential, all_peak_locations, all_peak_values, basin_depth_ratio.value, missing_H
+        )
+    else:
+        if auto_threshold is not None and auto_threshold.value:
+            threshold = get_auto_threshold(
+                new_structure, all_peak_locations, all_peak_values, potential.shape, missing_H
+            )
+        peak_locations, peak_values, proximity_blocked = place_hydrogens_on_peaks(
+            new_structure, all_peak_locations, all_peak_values, potential.shape, threshold, missing_H, tolerances
+        )
 
-            new_structure.append('H', scaled_pos, validate_proximity=True)
+    number_sites = summary.number_sites
+
+    if geometric_sites is not None and geometric_sites.value:
+        snap_to_hydrogen_sites(new_structure, number_sites, get_hydrogen_sites(structure)[0])
+
+    for _ in range((predictor_rounds.value if predictor_rounds is not None else 1) - 1):
+        new_positions = new_structure.frac_coords[number_sites:]
+        # Only hydrogens are added, so the missing ones follow from the number of sites
+        missing_H = num_H.value - count_hydrogens(structure_data) - (len(new_structure) - summary.number_sites)
+
+        if len(new_positions) == 0 or missing_H == 0:
+            break
+
+        number_sites = len(new_structure)
+        potential = add_protons_to_potential(potential, new_structure.lattice.matrix, new_positions, PREDICTOR_WIDTH)
+        if basin_depth_ratio is not None:
+            place_hydrogens_in_basins(
+                new_structure, potential, *find_peaks(potential, do_supercell.value), basin_depth_ratio.value, missing_H
+            )
+        else:
+            round_peak_locations, round_peak_values = find_peaks(potential, do_supercell.value)
+            round_threshold = equiv_peak_threshold.value
+            if auto_threshold is not None and auto_threshold.value:
+                round_threshold = get_auto_threshold(
+                    new_structure, round_peak_locations, round_peak_values, potential.shape, missing_H
+                )
+            place_hydrogens_on_peaks(
+                new_structure, round_peak_locations, round_peak_values, potential.shape, round_threshold, missing_H,
+                tolerances
+            )
 
-    
     all_peaks = orm.ArrayData()
     all_peaks.set_array('peak_values', peak_values)
     all_peaks.set_array('peak_positions', np.divide(peak_locations, potential.shape)) 
+    all_peaks.set_array('all_peak_locations', all_peak_locations)
+    all_peaks.set_array('all_peak_values', all_peak_values)
+    all_peaks.set_array('equiv_peak_threshold', np.array([threshold]))
+    all_peaks.set_array('proximity_blocked', np.array([proximity_blocked]))
+    for key, values in basin_properties.items():
+        all_peaks.set_array(f'basin_{key}', values)
+    if basin_properties:
+        all_peaks.set_array('peak_prominences', basin_properties['depths'][basin_properties['selected']])
 
 
     return {
         'new_structure': orm.StructureData(pymatgen=new_structure),
         'all_peaks': all_peaks
     }
+
+
+@calcfunction
+def add_geometric_hydrogens(structure_data: orm.StructureData, num_H: orm.Int) -> orm.StructureData:
+    """Add the hydrogens proposed by the bonding geometry of a structure, before any potential is computed.
+
+    The hydrogens are only added if the geometric sites are not more than the missing hydrogens, since otherwise it is
+    not clear which of them are occupied.
+    """
+    structure = structure_data.get_pymatgen()
+    positions, _ = get_hydrogen_sites(structure)
+    missing_H = num_H.value - count_hydrogens(structure_data)
+
+    if 0 < len(positions) <= missing_H:
+        place_hydrogens(structure, positions, len(positions))
+
+    return orm.StructureData(pymatgen=structure)
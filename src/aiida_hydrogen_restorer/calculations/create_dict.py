@@ -1,14 +1,72 @@
 # -*- coding: utf-8 -*-
 """Calculation function to create a dictionary"""
 
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 from aiida.engine import calcfunction
 from aiida import orm
 import collections
-#from collections import Counter
 import lowdimfinder
-import json
+
+DIMENSIONALITY_EXTRA = 'dimensionality_summary'
+
+
+def get_dimensionality_summary(atoms):
+    """Evaluate the dimensionality of the sub components of an ASE `Atoms` object.
+
+    :return: dictionary with the `dimensionality_noH` and `chemical_formula_noH` summaries.
+    """
+    group_data = lowdimfinder.LowDimFinder(atoms, bond_margin=0.2).get_group_data()
+    dimensionality = collections.Counter(group_data['dimensionality'])
+
+    # The key of the dimensionality has to be stored as a string
+    return {
+        'dimensionality_noH': {str(list(dimensionality.keys())): list(dimensionality.values())},
+        'chemical_formula_noH': dict(collections.Counter(group_data['chemical_formula'])),
+    }
+
+
+def get_dimensionality_summaries(structures, max_workers=None):
+    """Evaluate the dimensionality of many structures in a process pool.
+
+    The summary of each structure is cached in its extras, and structures with the same hash are only evaluated once,
+    so rerunning on a database release only evaluates the new structures. No provenance nodes are created.
+
+    :param structures: iterable of `StructureData` nodes.
+    :param max_workers: maximum number of processes in the pool.
+    :return: dictionary that maps the UUID of each structure onto its summary.
+    """
+    summaries = {}
+    pending = {}
+
+    for structure in structures:
+        try:
+            summaries[structure.uuid] = structure.base.extras.get(DIMENSIONALITY_EXTRA)
+        except AttributeError:
+            pending.setdefault(structure.base.caching.get_hash(), []).append(structure)
+
+    # Reuse the summaries of identical structures that were already evaluated
+    if pending:
+        query = orm.QueryBuilder().append(
+            orm.StructureData,
+            filters={'extras._aiida_hash': {'in': list(pending)}, 'extras': {'has_key': DIMENSIONALITY_EXTRA}},
+            project=['extras._aiida_hash', f'extras.{DIMENSIONALITY_EXTRA}']
+        )
+        for structure_hash, summary in query.iterall():
+            for structure in pending.pop(structure_hash, []):
+                structure.base.extras.set(DIMENSIONALITY_EXTRA, summary)
+                summaries[structure.uuid] = summary
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            get_dimensionality_summary, [group[0].get_ase() for group in pending.values()], chunksize=16
+        )
+        for group, summary in zip(pending.values(), results):
+            for structure in group:
+                structure.base.extras.set(DIMENSIONALITY_EXTRA, summary)
+                summaries[structure.uuid] = summary
+
+    return summaries
 
 
 @calcfunction
@@ -16,15 +74,8 @@ def create_infodict(
     structure_data: orm.StructureData
     )-> dict:
     """Evaluate the dimensionality of the sub components of the structure"""
+    summary = get_dimensionality_summary(structure_data.get_ase())
 
-    s = structure_data.get_ase()
-    l = lowdimfinder.LowDimFinder(s, bond_margin=0.2)
-    #It is necessary to store the key of the dimensionality as a string. Thus I have rebuild the dictionary (maybe theres a better way?)
-    key_dimensionality_noH = str(list(collections.Counter(l.get_group_data()['dimensionality']).keys()))
-    value_dimensionality_noH = list(collections.Counter(l.get_group_data()['dimensionality']).values())
-    dimensionality_noH = {key_dimensionality_noH : value_dimensionality_noH}
-    chemical_formula_noH = dict(collections.Counter(l.get_group_data()['chemical_formula']))
-
-    return {'dimensionality_noH': orm.Dict(dimensionality_noH),
-            'chemical_formula_noH' : orm.Dict(chemical_formula_noH)
-    }
\ No newline at end of file
+    return {'dimensionality_noH': orm.Dict(summary['dimensionality_noH']),
+            'chemical_formula_noH' : orm.Dict(summary['chemical_formula_noH'])
+    }
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Calculation functions to split a molecular crystal into its fragments and reassemble it."""
+
+from collections import Counter, deque
+
+import lowdimfinder
+import numpy as np
+from pymatgen.analysis.molecule_structure_comparator import CovalentRadius
+from pymatgen.core import Composition, Lattice, Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+from aiida.engine import calcfunction
+from aiida import orm
+
+BOND_MARGIN = 0.2
+
+
+def get_fragments(structure, bond_margin=BOND_MARGIN):
+    """Return the site indices and unwrapped Cartesian coordinates of the molecular fragments of a structure.
+
+    Two sites are bonded if their distance is smaller than the sum of their covalent radii, increased by the
+    `bond_margin` fraction.
+
+    :raises ValueError: if a fragment is bonded to one of its own periodic images, i.e. it is not 0D.
+    """
+    radii = np.array([CovalentRadius.radius[site.specie.symbol] for site in structure])
+    centers, neighbours, images, distances = structure.get_neighbor_list(r=2 * radii.max() * (1 + bond_margin))
+    bonded = distances < (radii[centers] + radii[neighbours]) * (1 + bond_margin)
+
+    bonds = [[] for _ in structure]
+    for center, neighbour, image in zip(centers[bonded], neighbours[bonded], images[bonded]):
+        bonds[center].append((neighbour, image))
+
+    offsets = [None] * len(structure)
+    fragments = []
+
+    for root in range(len(structure)):
+        if offsets[root] is not None:
+            continue
+        offsets[root] = np.zeros(3)
+        indices = [root]
+        queue = deque([root])
+        while queue:
+            center = queue.popleft()
+            for neighbour, image in bonds[center]:
+                offset = offsets[center] + image
+                if offsets[neighbour] is None:
+                    offsets[neighbour] = offset
+                    indices.append(int(neighbour))
+                    queue.append(neighbour)
+                elif not np.allclose(offsets[neighbour], offset):
+                    raise ValueError(f'the fragment containing site {root} is bonded to its own periodic image.')
+
+        frac_coords = structure.frac_coords[indices] + np.array([offsets[index] for index in indices])
+        fragments.append((indices, structure.lattice.get_cartesian_coords(frac_coords)))
+
+    return fragments
+
+
+def find_mapping_operation(structure, operations, source, target, tolerance=0.1):
+    """Return the first symmetry operation that maps the `source` onto the `target` fractional coordinates."""
+    for operation in operations:
+        distances = structure.lattice.get_all_distances(operation.operate_multi(source), target)
+        if np.all(distances.min(axis=1) < tolerance) and np.all(distances.min(axis=0) < tolerance):
+            return operation
+    return None
+
+
+@calcfunction
+def extract_fragments(
+    structure_data: orm.StructureData,
+    number_hydrogen: orm.Int,
+    vacuum: orm.Float,
+    fragment_number_hydrogen: orm.Dict = None
+    ) -> dict:
+    """Extract the symmetry-unique molecular fragments of a structure, each in an orthorhombic box.
+
+    The number of hydrogen of each fragment is taken from `fragment_number_hydrogen`, which maps the formula of a
+    fragment onto its number of hydrogen. If it is not provided, the `number_hydrogen` of the crystal is distributed
+    evenly, which is only possible if all fragments have the same composition.
+
+    :raises ValueError: if the structure is not a molecular crystal, or the hydrogen cannot be distributed.
+    """
+    finder = lowdimfinder.LowDimFinder(structure_data.get_ase(), bond_margin=BOND_MARGIN)
+    dimensionality = set(finder.get_group_data()['dimensionality'])
+
+    if dimensionality != {0}:
+        raise ValueError(f'the structure is not a molecular crystal, found components of dimensionality {dimensionality}')
+
+    structure = structure_data.get_pymatgen()
+    operations = SpacegroupAnalyzer(structure).get_symmetry_operations()
+
+    fragments = []
+    representatives = []
+
+    for indices, cart_coords in get_fragments(structure):
+        formula = Composition(Counter(structure[index].species_string for index in indices)).formula.replace(' ', '')
+        frac_coords = structure.lattice.get_fractional_coords(cart_coords)
+
+        for number, representative in enumerate(representatives):
+            if representative['formula'] != formula:
+                continue
+            source = structure.lattice.get_fractional_coords(representative['cart_coords'])
+            operation = find_mapping_operation(structure, operations, source, frac_coords)
+            if operation is not None:
+                break
+        else:
+            number = len(representatives)
+            operation = None
+            representatives.append({
+                'formula': formula,
+                'species': [structure[index].species_string for index in indices],
+                'cart_coords': cart_coords,
+                'occurrences': 0,
+            })
+
+        representatives[number]['occurrences'] += 1
+        fragments.append({
+            'indices': indices,
+            'representative': number,
+            'rotation': np.eye(3).tolist() if operation is None else operation.rotation_matrix.tolist(),
+            'translation': [0, 0, 0] if operation is None else operation.translation_vector.tolist(),
+        })
+
+    if fragment_number_hydrogen is not None:
+        numbers = fragment_number_hydrogen.get_dict()
+        missing = {rep['formula'] for rep in representatives} - set(numbers)
+        if missing:
+            raise ValueError(f'no number of hydrogen was provided for the fragments: {", ".join(missing)}')
+    elif len({rep['formula'] for rep in representatives}) == 1 and number_hydrogen.value % len(fragments) == 0:
+        numbers = {representatives[0]['formula']: number_hydrogen.value // len(fragments)}
+    else:
+        raise ValueError('the number of hydrogen cannot be distributed over the fragments, provide them explicitly.')
+
+    results = {}
+    fragment_data = {'fragments': fragments, 'representatives': []}
+
+    for number, representative in enumerate(representatives):
+        cart_coords = representative['cart_coords']
+        offset = vacuum.value - cart_coords.min(axis=0)
+        box = Lattice.orthorhombic(*(np.ptp(cart_coords, axis=0) + 2 * vacuum.value))
+
+        results[f'fragment_{number}'] = orm.StructureData(
+            pymatgen=Structure(box, representative['species'], cart_coords + offset, coords_are_cartesian=True)
+        )
+        fragment_data['representatives'].append({
+            'formula': representative['formula'],
+            'occurrences': representative['occurrences'],
+            'number_hydrogen': numbers[representative['formula']],
+            'offset': offset.tolist(),
+        })
+
+    results['fragment_data'] = orm.Dict(fragment_data)
+
+    return results
+
+
+@calcfunction
+def assemble_fragments(
+    structure_data: orm.StructureData,
+    fragment_data: orm.Dict,
+    **restored_fragments
+    ) -> orm.StructureData:
+    """Place the hydrogen of the restored fragments back onto every equivalent fragment of the crystal."""
+    structure = structure_data.get_pymatgen()
+    structure.remove_species(['H'])
+
+    representatives = fragment_data['representatives']
+
+    for fragment in fragment_data['fragments']:
+        number = fragment['representative']
+        restored = restored_fragments[f'fragment_{number}'].get_pymatgen()
+
+        hydrogen_coords = np.array([site.coords for site in restored if site.species_string == 'H'])
+        if len(hydrogen_coords) == 0:
+            continue
+
+        frac_coords = structure.lattice.get_fractional_coords(hydrogen_coords - representatives[number]['offset'])
+        frac_coords = frac_coords @ np.array(fragment['rotation']).T + np.array(fragment['translation'])
+
+        for frac_coord in frac_coords:
+            structure.append('H', frac_coord, validate_proximity=True)
+
+    return orm.StructureData(pymatgen=structure)
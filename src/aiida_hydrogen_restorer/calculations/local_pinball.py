@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Calculation function to place hydrogens on the best subset of candidate peaks without a pinball calculation."""
+
+from aiida.engine import calcfunction
+from aiida import orm
+from qe_tools import CONSTANTS
+
+from aiida_hydrogen_restorer.utils.local_pinball import get_interaction_matrix, search_best_subset
+from aiida_hydrogen_restorer.utils.symmetry import get_orbits
+
+
+@calcfunction
+def run_local_pinball(structure_data: orm.StructureData, all_peaks: orm.ArrayData, number_hydrogen: orm.Int) -> dict:
+    """Place hydrogens on the subset of the candidate peaks with the lowest energy, searched in-process.
+
+    The energy of a proton on a peak is the opposite of the potential there, and the protons interact through their
+    periodic Coulomb energy plus a short-range repulsion, see `aiida_hydrogen_restorer.utils.local_pinball`.
+
+    :param all_peaks: the `all_peaks` output of `add_hydrogens_to_structure`, the candidates are its `peak_positions`.
+    :param number_hydrogen: the number of hydrogens to place.
+    """
+    structure = structure_data.get_pymatgen()
+    positions = all_peaks.get_array('peak_positions')
+    site_energies = -all_peaks.get_array('peak_values') * CONSTANTS.ry_to_ev
+
+    subset, energy, branches = search_best_subset(
+        site_energies,
+        get_interaction_matrix(structure.lattice, positions),
+        number_hydrogen.value,
+        get_orbits(structure, positions),
+    )
+
+    if subset is None:
+        raise ValueError(f'no {number_hydrogen.value} of the {len(positions)} candidate peaks can be occupied together.')
+
+    for index in subset:
+        structure.append('H', positions[index])
+
+    return {
+        'final_structure': orm.StructureData(pymatgen=structure),
+        'output_parameters': orm.Dict({'energy': energy, 'indices': subset, 'branches': branches}),
+    }
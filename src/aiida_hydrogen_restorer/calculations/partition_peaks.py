@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Calculation function to split the candidate peaks of a pinball search into independent chunks."""
+
+import numpy as np
+
+from aiida.engine import calcfunction
+from aiida import orm
+
+from aiida_hydrogen_restorer.utils.partition import partition_by_orbit, partition_by_region
+
+
+@calcfunction
+def partition_peaks(
+    structure_data: orm.StructureData,
+    all_peaks: orm.ArrayData,
+    number_chunks: orm.Int,
+    partition_mode: orm.Str,
+    number_hydrogen: orm.Int,
+    ) -> dict:
+    """Split the candidate peaks into chunks that can be searched by independent pinball calculations.
+
+    Each chunk has at least `number_hydrogen` candidates, so that all hydrogens can be placed within it.
+
+    :param partition_mode: `orbit` to keep the symmetry orbits whole, or `region` to cut the cell in slabs.
+    :return: dictionary with an `ArrayData` with the `peak_positions` and `peak_values` of each chunk, labelled
+        `chunk_0`, `chunk_1`, ...
+    """
+    structure = structure_data.get_pymatgen()
+    positions = all_peaks.get_array('peak_positions')
+    values = all_peaks.get_array('peak_values')
+
+    if partition_mode.value == 'orbit':
+        chunks = partition_by_orbit(structure, positions, values, number_chunks.value, number_hydrogen.value)
+    elif partition_mode.value == 'region':
+        chunks = partition_by_region(structure, positions, number_chunks.value, number_hydrogen.value)
+    else:
+        raise ValueError(f'unknown partition mode `{partition_mode.value}`.')
+
+    results = {}
+
+    for index, chunk in enumerate(chunks):
+        chunk = np.sort(chunk)
+        chunk_peaks = orm.ArrayData()
+        chunk_peaks.set_array('peak_positions', positions[chunk])
+        chunk_peaks.set_array('peak_values', values[chunk])
+        results[f'chunk_{index}'] = chunk_peaks
+
+    return results
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Calculation functions to run the restoration on the primitive cell and map the result back."""
+
+import numpy as np
+
+from aiida.engine import calcfunction
+from aiida import orm
+
+
+@calcfunction
+def get_primitive_structure(
+    structure_data: orm.StructureData,
+    number_hydrogen: orm.Int
+    ) -> dict:
+    """Reduce a structure to its Niggli-reduced primitive cell and scale the number of hydrogen accordingly.
+
+    If the number of hydrogen cannot be distributed evenly over the primitive cells, the structure is returned as is.
+    """
+    structure = structure_data.get_pymatgen()
+    primitive = structure.get_primitive_structure().get_reduced_structure(reduction_algo='niggli')
+
+    if (number_hydrogen.value * len(primitive)) % len(structure) != 0:
+        primitive = structure
+
+    return {
+        'primitive_structure': orm.StructureData(pymatgen=primitive),
+        'number_hydrogen': orm.Int(number_hydrogen.value * len(primitive) // len(structure))
+    }
+
+
+@calcfunction
+def map_hydrogens_to_structure(
+    structure_data: orm.StructureData,
+    restored_structure: orm.StructureData,
+    number_hydrogen: orm.Int
+    ) -> orm.StructureData:
+    """Map the hydrogens of a structure restored in the primitive cell onto the original cell.
+
+    The restored structure is expanded to a supercell that matches the lattice of the original one and shifted to
+    the origin of the original cell. All hydrogens of the original structure are replaced by those of the expanded
+    restored structure, after checking that all the other sites coincide.
+
+    :raises ValueError: if the restored structure is not consistent with the original cell.
+    """
+    original = structure_data.get_pymatgen()
+    restored = restored_structure.get_pymatgen()
+
+    scaling_matrix = np.rint(original.lattice.matrix @ restored.lattice.inv_matrix)
+
+    if not np.allclose(scaling_matrix @ restored.lattice.matrix, original.lattice.matrix, atol=1e-3):
+        raise ValueError('the lattice of the restored structure is not commensurate with the original one.')
+
+    supercell = restored.copy()
+    supercell.make_supercell(scaling_matrix.astype(int))
+
+    host = original.copy()
+    host.remove_species(['H'])
+    supercell_host = supercell.copy()
+    supercell_host.remove_species(['H'])
+
+    if sorted(host.species) != sorted(supercell_host.species):
+        raise ValueError('the restored structure does not contain the same sites as the original one.')
+
+    # Find the translation that brings the host sites of the supercell onto those of the original cell
+    reference = host[0]
+    for site in supercell_host:
+        if site.species != reference.species:
+            continue
+        translation = reference.coords - site.coords
+        shifted = original.lattice.get_fractional_coords(supercell_host.cart_coords + translation)
+        distances = original.lattice.get_all_distances(shifted, host.frac_coords)
+        if np.all(distances.min(axis=1) < 0.1) and np.all(distances.min(axis=0) < 0.1):
+            break
+    else:
+        raise ValueError('the host sites of the restored structure do not match those of the original one.')
+
+    for site in supercell:
+        if site.species_string == 'H':
+            host.append('H', site.coords + translation, coords_are_cartesian=True, validate_proximity=True)
+
+    if host.composition['H'] != supercell.composition['H'] or host.composition['H'] > number_hydrogen.value:
+        raise ValueError('the hydrogens of the restored structure could not all be mapped onto the original cell.')
+
+    return orm.StructureData(pymatgen=host)
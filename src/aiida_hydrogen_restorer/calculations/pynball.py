@@ -11,11 +11,16 @@ from aiida.engine import CalcJob
 from aiida_pseudo.data.pseudo.upf import UpfData
 from aiida_quantumespresso.calculations.pw import PwCalculation
 
+from aiida_hydrogen_restorer.utils.candidates import filter_candidates
+from aiida_hydrogen_restorer.utils.symmetry import get_orbits
+
 class PynballCalculation(CalcJob):
     """``CalcJob`` implementation for the Python pynball module."""
 
     DEFAULT_OUTPUT_FILE = 'speriamobene.txt'
     DEFAULT_INPUT_FILE = 'pinball.json'
+    DEFAULT_JSON_OUTPUT_FILE = 'output.json'
+    DEFAULT_CIF_OUTPUT_FILE = 'output.cif'
 
     @classmethod
     def define(cls, spec):
@@ -23,6 +28,9 @@ class PynballCalculation(CalcJob):
         super().define(spec)
         spec.input('metadata.options.parser_name', valid_type=str, 
                    default='hydrogen_restorer.pynball')
+        spec.input('metadata.options.debug', valid_type=bool, default=False,
+                   help='If True the standard output and the CIF file are stored in the repository, instead of only '
+                        'being retrieved temporarily for parsing.')
         spec.input('parent_folder', valid_type=orm.RemoteData,
                    help='the folder of a completed SCF `PwCalculation`')
         spec.input('all_peaks', valid_type=orm.ArrayData,
@@ -31,8 +39,16 @@ class PynballCalculation(CalcJob):
                    help='Number of hydrogen atoms to place.')
         spec.input('hydrogen_pseudo', valid_type=UpfData,
                    help='The pseudopotential to use for hydrogen.')
+        spec.input('structure', valid_type=orm.StructureData, required=False,
+                   help='The host structure, used to filter the candidate positions and group them in symmetry orbits.')
+        spec.input('filters', valid_type=orm.Dict, required=False,
+                   help='Filters applied to the candidate positions if the `structure` is given: `min_host_distance` in '
+                        'Angstrom, `min_value_ratio` relative to the highest peak and `min_prominence`, which requires '
+                        'a `peak_prominences` array in `all_peaks`.')
         spec.output('final_structure', valid_type=orm.StructureData)
         spec.output('output_parameters', valid_type=orm.Dict)
+        spec.output('energies', valid_type=orm.ArrayData, required=False,
+                    help='The energy of each configuration explored by pinball, if they are reported.')
         spec.exit_code(321, 'ERROR_READING_CIF',
                        'Failed to parse the resulting CIF file.')
         spec.exit_code(322, 'ERROR_READING_JSON',
@@ -43,15 +59,33 @@ class PynballCalculation(CalcJob):
 
         # Prepare the contents of the JSON input file
         peak_positions = self.inputs.all_peaks.get_array('peak_positions')        
-        peak_positions = peak_positions.tolist()
 
         pinball_input = {
             'pwin': PwCalculation._DEFAULT_INPUT_FILE,
             "tot_pinballs": self.inputs.number_hydrogen.value, 
             "pseudo": self.inputs.hydrogen_pseudo.filename, 
-            "positions": peak_positions
         }
 
+        if 'structure' in self.inputs:
+            structure = self.inputs.structure.get_pymatgen()
+            filters = self.inputs.filters.get_dict() if 'filters' in self.inputs else {}
+            prominences = None
+            if 'peak_prominences' in self.inputs.all_peaks.get_arraynames():
+                prominences = self.inputs.all_peaks.get_array('peak_prominences')
+
+            kept = filter_candidates(
+                structure,
+                peak_positions,
+                self.inputs.all_peaks.get_array('peak_values'),
+                prominences=prominences,
+                **filters
+            )
+            self.report(f'kept {len(kept)} out of {len(peak_positions)} candidate positions for pinball.')
+            peak_positions = peak_positions[kept]
+            pinball_input['orbits'] = get_orbits(structure, peak_positions).tolist()
+
+        pinball_input['positions'] = peak_positions.tolist()
+
         with folder.open(self.DEFAULT_INPUT_FILE, 'w') as handle:
             handle.write(json.dumps(pinball_input))
 
@@ -94,9 +128,11 @@ class PynballCalculation(CalcJob):
         calcinfo.remote_copy_list = remote_copy_list
         calcinfo.local_copy_list = local_copy_list
 
-        calcinfo.retrieve_list = [
-            self.DEFAULT_OUTPUT_FILE,
-            'output.cif',
-            'output.json'
-        ]
+        calcinfo.retrieve_list = [self.DEFAULT_JSON_OUTPUT_FILE]
+        calcinfo.retrieve_temporary_list = [self.DEFAULT_OUTPUT_FILE, self.DEFAULT_CIF_OUTPUT_FILE]
+
+        if self.inputs.metadata.options.debug:
+            calcinfo.retrieve_list += calcinfo.retrieve_temporary_list
+            calcinfo.retrieve_temporary_list = []
+
         return calcinfo
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Command line interface of the `aiida-hydrogen-restorer` plugin."""
+
+import click
+import tabulate
+
+from aiida.cmdline.groups import VerdiCommandGroup
+from aiida.cmdline.params import options, types
+from aiida.cmdline.utils import decorators, echo
+
+
+@click.group('aiida-hydrogen-restorer', cls=VerdiCommandGroup, context_settings={'help_option_names': ['-h', '--help']})
+@options.PROFILE(type=types.ProfileParamType(load_profile=True), expose_value=False)
+def cli():
+    """Command line interface of the `aiida-hydrogen-restorer` plugin."""
+
+
+@cli.command('report')
+@click.argument('filename', type=click.Path(dir_okay=False))
+@click.option('-L', '--process-label', multiple=True,
+              help='Process label of the work chains to include, by default all the restoration work chains.')
+@click.option('--page-size', type=int, default=1000, show_default=True,
+              help='Number of work chains fetched per query.')
+@decorators.with_dbenv()
+def cmd_report(filename, process_label, page_size):
+    """Write the results of the restoration work chains to FILENAME, in Parquet if it ends with `.parquet` else CSV.
+
+    The success rates and timings of each work chain class are printed once the file is written.
+    """
+    from aiida_hydrogen_restorer.utils.report import (
+        RESTORATION_PROCESS_LABELS, get_summary, iter_restoration_rows, write_rows
+    )
+
+    rows = list(iter_restoration_rows(process_label or RESTORATION_PROCESS_LABELS, page_size))
+    write_rows(rows, filename)
+
+    echo.echo(tabulate.tabulate(get_summary(rows), headers='keys', floatfmt='.3g'))
+    echo.echo_success(f'wrote {len(rows)} work chains to `{filename}`.')
+
+
+@cli.command('restart')
+@click.argument('pks', type=int, nargs=-1, required=True)
+@decorators.with_dbenv()
+def cmd_restart(pks):
+    """Resume the failed restoration work chains among PKS from their last good iteration."""
+    from aiida import orm
+
+    from aiida_hydrogen_restorer.utils.restart import submit_restarts
+
+    restarts = submit_restarts(orm.load_node(pk) for pk in pks)
+
+    for pk, node in restarts.items():
+        echo.echo(f'<{pk}> resumed by <{node.pk}>')
+
+    echo.echo_success(f'submitted {len(restarts)} restarts, skipped {len(pks) - len(restarts)} work chains.')
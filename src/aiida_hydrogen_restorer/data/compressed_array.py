@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""`ArrayData` that stores its arrays compressed and in single precision."""
+
+import io
+
+import numpy as np
+
+from aiida import orm
+
+# Suffix of the repository files that hold the arrays
+ARRAY_SUFFIX = '.npz'
+
+
+class CompressedArrayData(orm.ArrayData):
+    """`ArrayData` that stores each array in a compressed `.npz` file, with floating point arrays in single precision.
+
+    The potential grids are smooth and are only used to locate their peaks, so the single precision loses nothing that
+    matters, and the compression removes most of the constant regions left by `crop_to_peaks`. The arrays are read back
+    with `get_array` as for any `ArrayData`.
+    """
+
+    def _arraynames_from_files(self):
+        """Return the names of the arrays from the files in the repository."""
+        return [
+            name[:-len(ARRAY_SUFFIX)] for name in self.base.repository.list_object_names() if name.endswith(ARRAY_SUFFIX)
+        ]
+
+    def set_array(self, name, array):
+        """Store an array in a compressed file, casting floating point arrays to single precision.
+
+        :param name: the name of the array.
+        :param array: the `numpy.ndarray` to store.
+        """
+        if not isinstance(array, np.ndarray):
+            raise TypeError('ArrayData can only store numpy arrays.')
+
+        if np.issubdtype(array.dtype, np.floating):
+            array = array.astype(np.float32)
+
+        handle = io.BytesIO()
+        np.savez_compressed(handle, array=array)
+        handle.seek(0)
+
+        self.base.repository.put_object_from_filelike(handle, f'{name}{ARRAY_SUFFIX}')
+        self.base.attributes.set(f'{self.array_prefix}{name}', list(array.shape))
+
+    def get_array(self, name=None):
+        """Return an array, see `ArrayData.get_array`."""
+        if name is None:
+            names = self.get_arraynames()
+            if len(names) != 1:
+                raise ValueError(f'`name` is required since the node contains {len(names)} arrays.')
+            name = names[0]
+
+        filename = f'{name}{ARRAY_SUFFIX}'
+
+        if filename not in self.base.repository.list_object_names():
+            raise KeyError(f'Array with name `{name}` not found in node<{self.pk}>')
+
+        with self.base.repository.open(filename, mode='rb') as handle:
+            return np.load(io.BytesIO(handle.read()), allow_pickle=False)['array']
+
+    def delete_array(self, name):
+        """Delete an array from the node."""
+        filename = f'{name}{ARRAY_SUFFIX}'
+
+        if filename not in self.base.repository.list_object_names():
+            raise KeyError(f'Array with name `{name}` not found in node<{self.pk}>')
+
+        self.base.repository.delete_object(filename)
+        self.base.attributes.delete(f'{self.array_prefix}{name}')
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Monitors that stop the relaxation and pinball calculations of the restoration work chains once they stall."""
+
+import re
+import tempfile
+from pathlib import Path
+
+from aiida.engine.processes.calcjobs.monitors import CalcJobMonitorAction, CalcJobMonitorResult
+
+TOTAL_ENERGY_REGEX = re.compile(r'^!\s+total energy\s+=\s+(-?\d+\.\d+)\s+Ry', re.MULTILINE)
+TOTAL_FORCE_REGEX = re.compile(r'Total force =\s+(\d+\.\d+)')
+PINBALL_ENERGY_REGEX = re.compile(r'energy\s*[=:]\s*(-?\d+\.?\d*(?:[eE][-+]?\d+)?)', re.IGNORECASE)
+
+
+def read_remote_file(node, filename, transport):
+    """Return the content of a file in the remote working directory of a calculation, or None if it does not exist."""
+    remote_path = Path(node.get_remote_workdir()) / filename
+
+    if not transport.isfile(str(remote_path)):
+        return None
+
+    with tempfile.NamedTemporaryFile('w+') as handle:
+        transport.getfile(str(remote_path), handle.name)
+        handle.seek(0)
+        return handle.read()
+
+
+def is_relaxation_stalled(energies, forces, window=20, energy_tolerance=1e-4):
+    """Return whether a relaxation stopped making progress.
+
+    A relaxation is stalled if none of the last `window` ionic steps lowered the total force below the lowest value of
+    the previous steps, and the total energy changed by less than `energy_tolerance` in Ry over these steps.
+    """
+    if len(forces) <= window or len(energies) <= window:
+        return False
+
+    no_new_force_minimum = min(forces[-window:]) >= min(forces[:-window])
+    no_energy_change = abs(energies[-1] - energies[-window - 1]) < energy_tolerance
+
+    return no_new_force_minimum and no_energy_change
+
+
+def monitor_relax(node, transport, window=20, energy_tolerance=1e-4):
+    """Stop a `PwCalculation` relaxation whose forces and energy stopped converging, see `is_relaxation_stalled`.
+
+    The calculation is retrieved and parsed, so the last structure of the relaxation is available, and it fails with
+    the `STOPPED_BY_MONITOR` exit code. The `PwBaseWorkChain` would restart it as an unhandled failure, so the
+    restoration work chains run the monitored relaxations with the `MonitoredPwBaseWorkChain`, which stops instead.
+    """
+    output = read_remote_file(node, node.get_option('output_filename'), transport)
+
+    if output is None:
+        return None
+
+    energies = [float(energy) for energy in TOTAL_ENERGY_REGEX.findall(output)]
+    forces = [float(force) for force in TOTAL_FORCE_REGEX.findall(output)]
+
+    if is_relaxation_stalled(energies, forces, window, energy_tolerance):
+        return (
+            f'the total force did not decrease below {min(forces):.6f} Ry/bohr and the total energy changed by less '
+            f'than {energy_tolerance} Ry over the last {window} ionic steps.'
+        )
+
+    return None
+
+
+def monitor_pinball(node, transport, patience=50):
+    """Stop a `PynballCalculation` whose best energy did not improve over the last `patience` reported energies.
+
+    The calculation is retrieved and parsed, and its exit status is the one of the parser rather than
+    `STOPPED_BY_MONITOR`, so that it finishes successfully if it already wrote its best configuration. This relies on
+    the code having written its `output.json` file before it is killed, since the parser reads the results from it: a
+    calculation killed before that fails with `ERROR_READING_JSON`.
+    """
+    output = read_remote_file(node, node.process_class.DEFAULT_OUTPUT_FILE, transport)
+
+    if output is None:
+        return None
+
+    energies = [float(energy) for energy in PINBALL_ENERGY_REGEX.findall(output)]
+
+    if len(energies) <= patience or min(energies[-patience:]) < min(energies[:-patience]):
+        return None
+
+    return CalcJobMonitorResult(
+        message=f'the best energy {min(energies)} did not improve over the last {patience} configurations.',
+        action=CalcJobMonitorAction.KILL,
+        retrieve=True,
+        parse=True,
+        override_exit_code=False,
+    )
+
+
+def get_stopped_calculation(node):
+    """Return the last calculation run by a failed relaxation work chain if it was stopped by a monitor, or None.
+
+    The calculation is only returned if its parser still produced the output structure, so the relaxation can continue
+    from it.
+    """
+    from aiida import orm
+
+    calcjobs = [descendant for descendant in node.called_descendants if isinstance(descendant, orm.CalcJobNode)]
+
+    if not calcjobs:
+        return None
+
+    calcjob = max(calcjobs, key=lambda calcjob: calcjob.ctime)
+
+    if calcjob.exit_status != calcjob.process_class.exit_codes.STOPPED_BY_MONITOR.status:
+        return None
+    if 'output_structure' not in calcjob.outputs or 'remote_folder' not in calcjob.outputs:
+        return None
+
+    return calcjob
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""`Parser` implementations for the `PpCalculation` that store the potential grid in less space."""
+
+from aiida_quantumespresso.parsers.pp import PpParser
+
+from aiida_hydrogen_restorer.data.compressed_array import CompressedArrayData
+from aiida_hydrogen_restorer.utils.peaks import find_peaks
+from aiida_hydrogen_restorer.utils.potential import crop_to_peaks
+
+# Half width in grid points of the box kept around each peak of a cropped potential
+CROP_RADIUS = 8
+
+# Name of the parser to use for each value of the `potential_storage` input of the work chains
+POTENTIAL_PARSERS = {
+    'compressed': 'hydrogen_restorer.pp_compressed',
+    'cropped': 'hydrogen_restorer.pp_cropped',
+}
+
+
+def validate_potential_storage(value, _):
+    """Validate the `potential_storage` input of the restoration work chains."""
+    if value is not None and value.value not in ('full', *POTENTIAL_PARSERS):
+        return f'`potential_storage` should be one of `full`, {", ".join(f"`{key}`" for key in POTENTIAL_PARSERS)}.'
+
+
+def validate_cropped_potential(inputs, _):
+    """Validate that the potential is not `cropped` if the restoration work chain places hydrogens in basins.
+
+    The watershed basins of `basin_depth_ratio` need the whole potential, which the `cropped` storage replaces by a
+    constant away from the peaks.
+    """
+    potential_storage = inputs.get('potential_storage', None)
+
+    if potential_storage is not None and potential_storage.value == 'cropped' and 'basin_depth_ratio' in inputs:
+        return '`potential_storage` cannot be `cropped` if `basin_depth_ratio` is specified.'
+
+
+def get_pp_parser_name(potential_storage):
+    """Return the parser name for the `PpCalculation` that stores its potential as `potential_storage`, or None."""
+    return POTENTIAL_PARSERS.get(potential_storage.value)
+
+
+class CompressedPpParser(PpParser):
+    """`PpParser` that stores the `output_data` as a `CompressedArrayData`."""
+
+    crop = False
+
+    def out(self, link_label, node=None):
+        """Attach an output node, converting the potential grid before it is stored."""
+        if link_label == 'output_data':
+            node = self.compress(node)
+
+        return super().out(link_label, node)
+
+    def compress(self, node):
+        """Return a `CompressedArrayData` with the arrays of `node`, with the `data` grid cropped if `crop` is True."""
+        compressed = CompressedArrayData()
+
+        for name in node.get_arraynames():
+            array = node.get_array(name)
+            if name == 'data' and self.crop:
+                peak_locations, _ = find_peaks(array)
+                array = crop_to_peaks(array, peak_locations, CROP_RADIUS)
+            compressed.set_array(name, array)
+
+        return compressed
+
+
+class CroppedPpParser(CompressedPpParser):
+    """`PpParser` that stores the `output_data` as a `CompressedArrayData` cropped to the neighbourhoods of its peaks.
+
+    The basins of the potential are lost, so this should not be used with the `basin_depth_ratio` input.
+    """
+
+    crop = True
@@ -2,36 +2,73 @@
 """`Parser` implementation for the `PynballCalculation` calculation job class."""
 
 import json
-from pymatgen.core import Structure
+from pathlib import Path
+
+import numpy as np
 
 from aiida import orm
 
 from aiida.parsers import Parser
-from aiida.common.exceptions import NotExistent
+
+# Keys of the JSON output that describe the final structure or the explored configurations, which are not copied into
+# the `output_parameters`
+STRUCTURE_KEYS = ('cell', 'symbols', 'positions')
+CONFIGURATION_KEYS = ('energies', 'configurations')
 
 
 class PynballParser(Parser):
     """`Parser` for the `PynballCalculation` calculation job class."""
 
     def parse(self, **kwargs):
-        """Parse the final structure and energy from the retrieved files."""
-        try:
-            out_folder = self.retrieved
-        except NotExistent:
-            return self.exit(self.exit_codes.ERROR_NO_RETRIEVED_FOLDER)
+        """Parse the final structure and energy from the retrieved files.
 
-        try:
-            with out_folder.open('output.cif', 'r') as handle:
-                structure_cif = handle.read()
-                structure = Structure.from_str(structure_cif, fmt='cif')
-        except OSError:
-            return self.exit(self.exit_codes.ERROR_READING_CIF)
+        The final structure is built directly from the `cell`, `symbols` and Cartesian `positions` in the JSON output
+        if they are present, falling back on parsing the CIF output otherwise. The energies of the explored
+        configurations are stored as an `ArrayData`, and only the remaining scalar results as `output_parameters`.
+        """
+        temporary_folder = kwargs.get('retrieved_temporary_folder', None)
 
         try:
-            with out_folder.open('output.json', 'r') as handle:
+            with self.open_output(self.node.process_class.DEFAULT_JSON_OUTPUT_FILE, temporary_folder) as handle:
                 output_dict = json.load(handle)
-        except OSError:
+        except (OSError, ValueError):
             return self.exit(self.exit_codes.ERROR_READING_JSON)
 
-        self.out('final_structure', orm.StructureData(pymatgen=structure))
+        if all(key in output_dict for key in STRUCTURE_KEYS):
+            structure = orm.StructureData(cell=output_dict['cell'])
+            for symbol, position in zip(output_dict['symbols'], output_dict['positions']):
+                structure.append_atom(position=position, symbols=symbol)
+        else:
+            try:
+                structure = self.parse_cif(temporary_folder)
+            except (OSError, ValueError):
+                return self.exit(self.exit_codes.ERROR_READING_CIF)
+
+        if 'energies' in output_dict:
+            energies = orm.ArrayData()
+            energies.set_array('energies', np.array(output_dict['energies'], dtype=float))
+            if 'configurations' in output_dict:
+                energies.set_array('configurations', np.array(output_dict['configurations'], dtype=int))
+            self.out('energies', energies)
+
+        for key in STRUCTURE_KEYS + CONFIGURATION_KEYS:
+            output_dict.pop(key, None)
+
+        self.out('final_structure', structure)
         self.out('output_parameters', orm.Dict(output_dict))
+
+    def open_output(self, filename, temporary_folder=None):
+        """Open an output file from the retrieved folder, or from the temporary retrieved folder if it is not there."""
+        if filename in self.retrieved.base.repository.list_object_names() or temporary_folder is None:
+            return self.retrieved.base.repository.open(filename, 'r')
+
+        return open(Path(temporary_folder) / filename, 'r', encoding='utf-8')
+
+    def parse_cif(self, temporary_folder=None):
+        """Return the final structure parsed from the CIF output."""
+        from pymatgen.core import Structure
+
+        with self.open_output(self.node.process_class.DEFAULT_CIF_OUTPUT_FILE, temporary_folder) as handle:
+            structure = Structure.from_str(handle.read(), fmt='cif')
+
+        return orm.StructureData(pymatgen=structure)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Watershed segmentation of the potential on a periodic grid into the basins of its peaks."""
+
+import itertools
+
+import numpy as np
+from skimage.segmentation import watershed
+
+
+def get_basins(potential, peak_locations):
+    """Return the label of the basin each grid point of the potential flows up to, taking the periodicity into account.
+
+    The watershed segmentation is run on the grid padded periodically by a quarter of its size along each axis, with
+    the periodic images of each peak marked with the same label, so that basins that cross the cell edges are not cut.
+
+    :param potential: the potential on a 3D grid.
+    :param peak_locations: the grid indices of the peaks, the basin of the peak with index `i` has label `i + 1`.
+    :return: the array of basin labels on the grid.
+    """
+    shape = np.array(potential.shape)
+    pad = shape // 4 + 1
+    padded_potential = np.pad(potential, [(width, width) for width in pad], mode='wrap')
+
+    markers = np.zeros(padded_potential.shape, dtype=int)
+    labels = np.arange(1, len(peak_locations) + 1)
+
+    for image in itertools.product((-1, 0, 1), repeat=3):
+        images = np.reshape(peak_locations, (-1, 3)) + pad + np.array(image) * shape
+        in_grid = ((images >= 0) & (images < padded_potential.shape)).all(axis=1)
+        markers[tuple(images[in_grid].T)] = labels[in_grid]
+
+    basins = watershed(-padded_potential, markers)
+
+    return basins[tuple(slice(width, width + size) for width, size in zip(pad, shape))]
+
+
+def get_basin_properties(potential, basins, number_basins, voxel_volume):
+    """Return the volume, depth and integrated value of each basin of the potential.
+
+    The depth of a basin is the difference between its peak and the highest saddle point on its boundary with another
+    basin, and its integrated value is the integral of the potential above that saddle point over the basin.
+
+    :param potential: the potential on a 3D grid.
+    :param basins: the array of basin labels on the grid, see `get_basins`.
+    :param number_basins: the number of basins, labelled from 1.
+    :param voxel_volume: the volume of a grid point, in Angstrom^3.
+    :return: dictionary with the arrays `volumes`, `depths` and `integrals`, in the order of the basin labels.
+    """
+    labels = basins.ravel() - 1
+    values = potential.ravel()
+
+    saddles = np.full(number_basins, potential.min())
+
+    for axis in range(potential.ndim):
+        neighbour_basins = np.roll(basins, -1, axis=axis).ravel() - 1
+        boundary = labels != neighbour_basins
+        boundary_values = np.minimum(values, np.roll(potential, -1, axis=axis).ravel())[boundary]
+        np.maximum.at(saddles, labels[boundary], boundary_values)
+        np.maximum.at(saddles, neighbour_basins[boundary], boundary_values)
+
+    peaks = np.full(number_basins, -np.inf)
+    np.maximum.at(peaks, labels, values)
+
+    return {
+        'volumes': np.bincount(labels, minlength=number_basins) * voxel_volume,
+        'depths': peaks - saddles,
+        'integrals': np.bincount(
+            labels, weights=np.maximum(values - saddles[labels], 0), minlength=number_basins
+        ) * voxel_volume,
+    }
+
+
+def select_basins(depths, basin_depth_ratio):
+    """Return the mask of the basins with a depth of at least `basin_depth_ratio` times the deepest one."""
+    return depths >= basin_depth_ratio * depths.max()
+
+
+def distribute_hydrogens(depths, integrals, missing_H, basin_depth_ratio):
+    """Decide how many hydrogens go in each basin.
+
+    The basins are selected with `select_basins`. Each selected basin
+    takes a number of hydrogens proportional to its integrated value, relative to the smallest selected basin. If this
+    adds up to more than the missing hydrogens, each selected basin takes a single hydrogen. No hydrogen is placed if
+    more basins are selected than hydrogens are missing.
+
+    :return: the array with the number of hydrogens of each basin.
+    """
+    selected = select_basins(depths, basin_depth_ratio)
+    hydrogens = np.zeros(len(depths), dtype=int)
+
+    if selected.sum() > missing_H:
+        return hydrogens
+
+    reference = integrals[selected].min()
+    if reference > 0:
+        hydrogens[selected] = np.maximum(np.rint(integrals[selected] / reference), 1)
+    if hydrogens.sum() > missing_H or reference <= 0:
+        hydrogens[selected] = 1
+
+    return hydrogens
+
+
+def get_basin_positions(potential, basins, label, number, lattice, separation):
+    """Return the fractional positions of `number` hydrogens in a basin.
+
+    The grid points of the basin are taken by decreasing value of the potential, skipping those closer than
+    `separation` in Angstrom to a position that was already taken.
+    """
+    locations = np.argwhere(basins == label)
+    locations = locations[np.argsort(-potential[tuple(locations.T)], kind='stable')]
+    positions = []
+
+    for position in np.divide(locations, potential.shape):
+        if len(positions) == number:
+            break
+        if positions and lattice.get_all_distances(position, positions).min() < separation:
+            continue
+        positions.append(position)
+
+    return np.array(positions).reshape(-1, 3)
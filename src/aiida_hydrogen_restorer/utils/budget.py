@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Utilities to stop a restoration loop that exceeds its budget or stops making progress."""
+
+
+def get_exceeded_budget(timings, wall_time, max_iterations=None, max_core_hours=None, max_wallclock_seconds=None):
+    """Return a description of the first budget that is exceeded, or None if the restoration is within budget.
+
+    :param timings: the `timings` context variable of the work chain, see `aiida_hydrogen_restorer.utils.timings`.
+    :param wall_time: the time in seconds since the work chain was created.
+    """
+    iterations = len(timings['iterations'])
+    core_hours = sum(process['core_hours'] for process in timings['processes'])
+
+    if max_iterations is not None and iterations >= max_iterations:
+        return f'reached the maximum of {max_iterations} iterations'
+    if max_core_hours is not None and core_hours >= max_core_hours:
+        return f'used {core_hours:.1f} core-hours out of {max_core_hours}'
+    if max_wallclock_seconds is not None and wall_time >= max_wallclock_seconds:
+        return f'ran for {wall_time:.0f} seconds out of {max_wallclock_seconds}'
+
+    return None
+
+
+def is_oscillating(iterations, window):
+    """Return whether the restoration loop oscillates instead of making progress.
+
+    The loop is considered to oscillate if, over the last `window` iterations, the number of peaks found flips back and
+    forth between two values while at most one hydrogen is added per iteration.
+
+    :param iterations: the per-iteration records of the `timings` context variable.
+    :param window: the number of iterations to consider, a value smaller than 3 disables the check.
+    """
+    if window < 3 or len(iterations) < window:
+        return False
+
+    recent = iterations[-window:]
+    peaks_found = [record['peaks_found'] for record in recent]
+
+    return (
+        len(set(peaks_found)) == 2
+        and all(peaks_found[index] == peaks_found[index - 2] for index in range(2, window))
+        and all(record['hydrogens_added'] <= 1 for record in recent)
+    )
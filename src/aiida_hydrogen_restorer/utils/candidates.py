@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Utilities to reduce the candidate hydrogen positions before a combinatorial search."""
+
+import numpy as np
+
+# Distance in Angstrom below which two candidate positions are considered duplicates
+DUPLICATE_TOLERANCE = 0.1
+
+
+def filter_candidates(
+    structure,
+    positions,
+    values,
+    min_host_distance=None,
+    min_value_ratio=None,
+    min_prominence=None,
+    prominences=None,
+    duplicate_tolerance=DUPLICATE_TOLERANCE,
+):
+    """Return the indices of the candidate positions that pass the filters, in their original order.
+
+    A candidate is removed if it coincides within `duplicate_tolerance` with a higher one, which happens when the same
+    site is found through a periodic or symmetry-equivalent image, if it is closer than `min_host_distance` to an atom
+    of the structure, if its value is below `min_value_ratio` times the highest value, or if its prominence is below
+    `min_prominence`.
+
+    :param structure: pymatgen `Structure` of the host.
+    :param positions: the fractional coordinates of the candidates.
+    :param values: the values of the potential at the candidates.
+    :param prominences: the prominence of each candidate, e.g. the depth of its basin, required for `min_prominence`.
+    """
+    positions = np.reshape(positions, (-1, 3))
+    values = np.asarray(values)
+    keep = np.ones(len(positions), dtype=bool)
+
+    if min_host_distance is not None and len(structure) > 0:
+        keep &= structure.lattice.get_all_distances(positions, structure.frac_coords).min(axis=1) >= min_host_distance
+
+    if min_value_ratio is not None and len(values) > 0:
+        keep &= values >= values.max() * min_value_ratio
+
+    if min_prominence is not None and prominences is not None:
+        keep &= np.asarray(prominences) >= min_prominence
+
+    kept = []
+
+    for index in np.argsort(-values, kind='stable'):
+        if not keep[index]:
+            continue
+        if kept and structure.lattice.get_all_distances(positions[index], positions[kept]).min() < duplicate_tolerance:
+            continue
+        kept.append(index)
+
+    return np.sort(np.array(kept, dtype=int))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Utilities to clean the remote working directories of the calculations run by the restoration work chains."""
+
+from aiida import orm
+
+
+def get_remote_folders(node):
+    """Return the remote folders of a `RemoteData` node, or of all calculation jobs run by a process."""
+    if isinstance(node, orm.RemoteData):
+        return [node]
+
+    calcjobs = [node] if isinstance(node, orm.CalcJobNode) else [
+        descendant for descendant in node.called_descendants if isinstance(descendant, orm.CalcJobNode)
+    ]
+    return [calcjob.outputs.remote_folder for calcjob in calcjobs if 'remote_folder' in calcjob.outputs]
+
+
+def clean_remote_folders(nodes):
+    """Clean the remote folders of the given nodes, opening a single transport for each computer.
+
+    :param nodes: iterable of `RemoteData` or `ProcessNode` nodes, see `get_remote_folders`.
+    :return: list of PKs of the cleaned `RemoteData` nodes.
+    """
+    remote_folders = {}
+
+    for node in nodes:
+        for remote_folder in get_remote_folders(node):
+            remote_folders.setdefault(remote_folder.computer.pk, {})[remote_folder.pk] = remote_folder
+
+    cleaned = []
+
+    for folders in remote_folders.values():
+        authinfo = next(iter(folders.values())).get_authinfo()
+        with authinfo.get_transport() as transport:
+            for remote_folder in folders.values():
+                try:
+                    remote_folder._clean(transport=transport)  # pylint: disable=protected-access
+                    cleaned.append(remote_folder.pk)
+                except (IOError, OSError):
+                    pass
+
+    return cleaned
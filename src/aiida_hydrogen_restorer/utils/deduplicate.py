@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Utilities to remove duplicate structures before submitting a batch of restorations."""
+
+from functools import reduce
+from math import floor, gcd, log
+
+from pymatgen.analysis.structure_matcher import StructureMatcher
+
+# Number of decimals to which the counts of a composition are rounded, e.g. for the fractional weights of mixed kinds
+COMPOSITION_DECIMALS = 3
+
+
+def reduce_composition(composition):
+    """Return the composition divided by its greatest common divisor, as a sorted tuple of symbols and counts.
+
+    The counts are first rounded to `COMPOSITION_DECIMALS`. If they are not all integers, e.g. because of the fractional
+    weights of mixed-occupancy kinds, they are instead divided by the smallest one.
+    """
+    counts = {symbol: round(count, COMPOSITION_DECIMALS) for symbol, count in composition.items()}
+
+    if all(float(count).is_integer() for count in counts.values()):
+        divisor = reduce(gcd, (int(count) for count in counts.values()))
+        return tuple(sorted((symbol, int(count) // divisor) for symbol, count in counts.items()))
+
+    divisor = min(counts.values())
+    return tuple(sorted((symbol, round(count / divisor, COMPOSITION_DECIMALS)) for symbol, count in counts.items()))
+
+
+def get_structure_fingerprint(structure, volume_tolerance=0.05):
+    """Return a cheap fingerprint of a `StructureData` that is invariant to setting, origin and supercell.
+
+    The fingerprint combines the reduced composition with the volume per atom, binned on a logarithmic scale so that
+    two structures whose volumes differ by less than `volume_tolerance` end up in the same or in neighbouring bins.
+    Only the node attributes are used, so no pymatgen conversion is needed.
+
+    :param structure: the `StructureData` to fingerprint.
+    :param volume_tolerance: relative tolerance on the volume per atom.
+    :return: tuple of the reduced composition and the volume bin.
+    """
+    reduced_composition = reduce_composition(structure.get_composition())
+
+    volume_per_atom = structure.get_cell_volume() / len(structure.sites)
+    volume_bin = floor(log(volume_per_atom) / log(1 + volume_tolerance))
+
+    return reduced_composition, volume_bin
+
+
+def deduplicate_structures(structures, volume_tolerance=0.05, matcher=None):
+    """Remove duplicate and near-duplicate structures from a list of `StructureData`.
+
+    Structures are indexed in a hash map by their fingerprint, see `get_structure_fingerprint`. A structure is only
+    compared with the `StructureMatcher` against the unique structures found so far in the same or neighbouring volume
+    bins of the same reduced composition, so the number of expensive comparisons stays small for large batches.
+
+    :param structures: iterable of `StructureData` nodes.
+    :param volume_tolerance: relative tolerance on the volume per atom used to bin the structures.
+    :param matcher: the `StructureMatcher` used to compare candidate pairs. Defaults to one that reduces to the primitive
+        cell, so different settings and supercells of the same compound are recognised as duplicates.
+    :return: tuple with the list of unique structures and a dictionary that maps the UUID of every duplicate onto the
+        UUID of the unique structure it duplicates.
+    """
+    matcher = matcher or StructureMatcher(primitive_cell=True, scale=True, attempt_supercell=True)
+
+    index = {}
+    pymatgen_cache = {}
+    unique = []
+    duplicates = {}
+
+    def get_pymatgen(structure):
+        if structure.uuid not in pymatgen_cache:
+            pymatgen_cache[structure.uuid] = structure.get_pymatgen()
+        return pymatgen_cache[structure.uuid]
+
+    for structure in structures:
+        composition, volume_bin = get_structure_fingerprint(structure, volume_tolerance)
+
+        candidates = [
+            candidate
+            for neighbour_bin in (volume_bin - 1, volume_bin, volume_bin + 1)
+            for candidate in index.get((composition, neighbour_bin), [])
+        ]
+        for candidate in candidates:
+            if matcher.fit(get_pymatgen(candidate), get_pymatgen(structure)):
+                duplicates[structure.uuid] = candidate.uuid
+                break
+        else:
+            index.setdefault((composition, volume_bin), []).append(structure)
+            unique.append(structure)
+
+    return unique, duplicates
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Export of the potentials, peaks and structures of finished restoration work chains to an HDF5 file.
+
+Each work chain is written to its own group, named after its UUID, so the file can be extended with later runs and
+read without access to the AiiDA profile::
+
+    /<uuid>/attrs                 process label, exit status, pk, number of hydrogen
+    /<uuid>/all_peaks/<name>      every array of the `all_peaks` output
+    /<uuid>/structure/<name>      `cell`, `positions` and `numbers` of the `final_structure` output
+    /<uuid>/potentials/<index>    the grid of each `PpCalculation` called by the work chain, in order of creation
+"""
+
+import numpy as np
+
+from aiida import orm
+
+# Compression of the datasets, which makes `h5py` chunk them automatically
+DATASET_OPTIONS = {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+
+
+def get_restoration_data(workchain):
+    """Return the UUID and the arrays and attributes of a restoration work chain to export, see the module docstring."""
+    data = {
+        'attrs': {
+            'pk': workchain.pk,
+            'process_label': workchain.process_label or '',
+            'exit_status': -1 if workchain.exit_status is None else workchain.exit_status,
+        },
+        'all_peaks': {},
+        'structure': {},
+        'potentials': {},
+    }
+
+    if 'number_hydrogen' in workchain.inputs:
+        data['attrs']['number_hydrogen'] = workchain.inputs.number_hydrogen.value
+
+    if 'all_peaks' in workchain.outputs:
+        all_peaks = workchain.outputs.all_peaks
+        data['all_peaks'] = {name: all_peaks.get_array(name) for name in all_peaks.get_arraynames()}
+
+    if 'final_structure' in workchain.outputs:
+        structure = workchain.outputs.final_structure.get_pymatgen()
+        data['structure'] = {
+            'cell': structure.lattice.matrix,
+            'positions': structure.cart_coords,
+            'numbers': np.array(structure.atomic_numbers),
+        }
+
+    pp_calculations = sorted(
+        (
+            node for node in workchain.called_descendants
+            if node.process_type == 'aiida.calculations:quantumespresso.pp' and 'output_data' in node.outputs
+        ),
+        key=lambda node: node.ctime,
+    )
+
+    for index, pp_calculation in enumerate(pp_calculations):
+        data['potentials'][str(index)] = pp_calculation.outputs.output_data.get_array('data')
+
+    return workchain.uuid, data
+
+
+def export_restorations(workchains, filename):
+    """Write the potentials, peaks and final structures of restoration work chains to an HDF5 file.
+
+    The work chains are read and written one at a time, so the grids of a single work chain are held at once. The
+    nodes are only loaded in the calling thread, since the storage backend is not thread-safe. The file is opened in
+    append mode and the work chains that are already in it are skipped, so the export can be repeated as the campaign
+    grows.
+
+    :param workchains: iterable of restoration work chain nodes or their pks.
+    :param filename: the path of the HDF5 file.
+    :return: the number of work chains that were added to the file.
+    """
+    try:
+        import h5py
+    except ImportError as exception:
+        message = 'the export requires `h5py`, install it with `pip install aiida-hydrogen-restorer[export]`.'
+        raise ImportError(message) from exception
+
+    pks = [workchain.pk if isinstance(workchain, orm.Node) else int(workchain) for workchain in workchains]
+    number_added = 0
+
+    with h5py.File(filename, 'a') as handle:
+        exported = set(handle.keys())
+
+        for pk in pks:
+            workchain = orm.load_node(pk)
+
+            if workchain.uuid in exported:
+                continue
+
+            uuid, data = get_restoration_data(workchain)
+            group = handle.create_group(uuid)
+            group.attrs.update(data['attrs'])
+
+            for section in ('all_peaks', 'structure', 'potentials'):
+                subgroup = group.create_group(section)
+                for name, array in data[section].items():
+                    options = DATASET_OPTIONS if array.size > 1 else {}
+                    subgroup.create_dataset(name, data=array, **options)
+
+            handle.flush()
+            exported.add(uuid)
+            number_added += 1
+
+    return number_added
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Geometric generator of hydrogen sites from the bonding geometry of the under-coordinated atoms of a structure."""
+
+import numpy as np
+from pymatgen.analysis.molecule_structure_comparator import CovalentRadius
+
+# Length in Angstrom of the bond between each element that can take hydrogens and a hydrogen
+HYDROGEN_BOND_LENGTHS = {'C': 1.09, 'N': 1.01, 'O': 0.97, 'S': 1.34}
+
+# Number of covalent bonds formed by each element that can take hydrogens
+VALENCES = {'C': 4, 'N': 3, 'O': 2, 'S': 2}
+
+# Elements that form covalent bonds, the bonds to all other elements only occupy a direction around the atom
+COVALENT_ELEMENTS = {'H', 'B', 'C', 'N', 'O', 'F', 'Si', 'P', 'S', 'Cl', 'Se', 'Br', 'I'}
+
+# Elements that accept a hydrogen bond, and the range of donor-acceptor distances in Angstrom
+ACCEPTORS = {'N', 'O', 'F', 'Cl'}
+ACCEPTOR_DISTANCES = (2.4, 3.3)
+
+# Single-bond covalent radii in Angstrom of the covalent elements, from P. Pyykkö and M. Atsumi, Chem. Eur. J. 15, 186
+# (2009), whose sums reproduce the lengths of single bonds used as the reference of the bond orders
+SINGLE_BOND_RADII = {
+    'H': 0.32, 'B': 0.85, 'C': 0.75, 'N': 0.71, 'O': 0.63, 'F': 0.64, 'Si': 1.16, 'P': 1.11, 'S': 1.03, 'Cl': 0.99,
+    'Se': 1.16, 'Br': 1.14, 'I': 1.33,
+}
+
+# Increase in Angstrom of the sum of the covalent radii below which two atoms are considered bonded
+BOND_MARGIN = 0.2
+
+# Minimum distance in Angstrom between a new hydrogen and the other atoms or new hydrogens
+MIN_DISTANCE = 1.4
+
+
+def get_bond_order(symbol_a, symbol_b, distance):
+    """Estimate the order of the bond between two atoms from its length, using Pauling's relation.
+
+    The reference single-bond length is the sum of the `SINGLE_BOND_RADII`, e.g. 1.50 Angstrom for C-C, so that the
+    C-C bonds of ethane, ethylene and acetylene have orders close to 1, 2 and 3.
+    """
+    single_bond_length = SINGLE_BOND_RADII[symbol_a] + SINGLE_BOND_RADII[symbol_b]
+    return np.exp((single_bond_length - distance) / 0.3)
+
+
+def get_number_domains(bond_orders, bond_vectors):
+    """Return the number of electron domains of an atom: 2 for sp, 3 for sp2 and 4 for sp3.
+
+    The hybridisation is estimated from the highest bond order and from the average angle between the bonds.
+    """
+    max_bond_order = max(bond_orders, default=0)
+    number_domains = 2 if max_bond_order >= 2.5 else 3 if max_bond_order >= 1.4 else 4
+
+    if len(bond_vectors) >= 2:
+        units = bond_vectors / np.linalg.norm(bond_vectors, axis=1)[:, None]
+        cosines = (units @ units.T)[np.triu_indices(len(units), k=1)]
+        mean_angle = np.degrees(np.arccos(np.clip(cosines, -1, 1))).mean()
+        number_domains = min(number_domains, 2 if mean_angle > 150 else 3 if mean_angle > 115 else 4)
+
+    return number_domains
+
+
+def get_perpendicular(vector, reference=None):
+    """Return a unit vector perpendicular to `vector`, in the plane of `reference` if it is given and not parallel."""
+    for candidate in ([] if reference is None else [reference]) + [np.eye(3)[np.argmin(np.abs(vector))]]:
+        perpendicular = candidate - np.dot(candidate, vector) * vector
+        if np.linalg.norm(perpendicular) > 1e-3:
+            return perpendicular / np.linalg.norm(perpendicular)
+
+
+def get_free_directions(bond_vectors, number_domains, reference=None):
+    """Return the unit vectors of the electron domains of an atom that are not occupied by a bond.
+
+    :param bond_vectors: the vectors from the atom to its bonded neighbours.
+    :param number_domains: the number of electron domains of the atom, see `get_number_domains`.
+    :param reference: vector that defines the plane of the free directions if the atom has a single bond, e.g. a bond
+        of its neighbour, so that sp2 atoms stay conjugated with their neighbour.
+    """
+    number_bonds = len(bond_vectors)
+
+    if number_bonds >= number_domains:
+        return np.zeros((0, 3))
+
+    if number_bonds == 0:
+        axis = np.array([0.0, 0.0, 1.0])
+        if number_domains == 2:
+            return np.array([axis, -axis])
+        # The first domain points along the axis, and the others are placed as if it were a bond
+        return np.vstack([axis, get_free_directions([axis], number_domains, reference)])
+
+    units = np.array(bond_vectors) / np.linalg.norm(bond_vectors, axis=1)[:, None]
+    opposite = -units.sum(axis=0)
+
+    if number_domains - number_bonds == 1:
+        return np.array([opposite / np.linalg.norm(opposite)])
+
+    if number_bonds == 1:
+        perpendicular = get_perpendicular(units[0], reference)
+        angle = np.radians(120 if number_domains == 3 else 109.47)
+        rotations = [0, 180] if number_domains == 3 else [0, 120, 240]
+        other = np.cross(units[0], perpendicular)
+        return np.array([
+            np.cos(angle) * units[0] + np.sin(angle) * (
+                np.cos(np.radians(rotation)) * perpendicular + np.sin(np.radians(rotation)) * other
+            ) for rotation in rotations
+        ])
+
+    # Two bonds of an sp3 atom: the two free directions are in the plane perpendicular to the bonds
+    bisector = opposite / np.linalg.norm(opposite)
+    normal = np.cross(units[0], units[1])
+    normal /= np.linalg.norm(normal)
+    half_angle = np.radians(109.47 / 2)
+    return np.array([np.cos(half_angle) * bisector + sign * np.sin(half_angle) * normal for sign in (1, -1)])
+
+
+def get_hydrogen_sites(structure):
+    """Return chemically motivated hydrogen sites for the under-coordinated C, N, O and S atoms of a structure.
+
+    The number of hydrogens each atom takes is its valence minus the sum of the orders of its bonds, estimated from their
+    lengths. The hydrogens are placed along the free directions of its sp, sp2 or sp3 geometry, at the standard X-H
+    bond length, preferring the directions that point to a hydrogen bond acceptor. The hydrogens of atoms without
+    covalent bonds, such as the oxygens of water molecules, are oriented towards the nearest acceptors.
+
+    :param structure: pymatgen `Structure`.
+    :return: tuple with the array of fractional coordinates of the hydrogen sites and the array of the indices of the
+        atoms they are bonded to.
+    """
+    symbols = np.array([site.specie.symbol for site in structure])
+    cart_coords = structure.cart_coords
+
+    centers, neighbours, images, distances = structure.get_neighbor_list(r=ACCEPTOR_DISTANCES[1])
+    vectors = structure.lattice.get_cartesian_coords(structure.frac_coords[neighbours] + images) - cart_coords[centers]
+
+    radii = np.array([CovalentRadius.radius.get(symbol, 1.5) for symbol in symbols])
+    bonded = distances < radii[centers] + radii[neighbours] + BOND_MARGIN
+    acceptor = np.isin(symbols[neighbours], list(ACCEPTORS)) & (distances >= ACCEPTOR_DISTANCES[0])
+
+    positions, parents, quotas = [], [], {}
+
+    for index in np.flatnonzero(np.isin(symbols, list(VALENCES))):
+        symbol = symbols[index]
+        bonds = (centers == index) & bonded
+        bond_vectors = vectors[bonds]
+        bond_orders = [
+            get_bond_order(symbol, symbols[neighbour], distance) if symbols[neighbour] in COVALENT_ELEMENTS else 0
+            for neighbour, distance in zip(neighbours[bonds], distances[bonds])
+        ]
+        number_hydrogens = int(np.clip(np.rint(VALENCES[symbol] - sum(bond_orders)), 0, None))
+
+        if number_hydrogens == 0:
+            continue
+
+        acceptor_vectors = vectors[(centers == index) & acceptor & ~bonded]
+        acceptor_vectors = acceptor_vectors[np.argsort(np.linalg.norm(acceptor_vectors, axis=1))]
+
+        if len(bond_vectors) == 0 and len(acceptor_vectors) > 0:
+            # Orient the first hydrogen towards the nearest acceptor and complete the sp3 geometry from it
+            first = acceptor_vectors[0] / np.linalg.norm(acceptor_vectors[0])
+            reference = acceptor_vectors[1] if len(acceptor_vectors) > 1 else None
+            directions = np.concatenate([[first], get_free_directions([first], 4, reference)])
+        else:
+            reference = None
+            if len(bond_vectors) == 1:
+                neighbour = neighbours[bonds][0]
+                other_bonds = (centers == neighbour) & bonded & (neighbours != index)
+                reference = vectors[other_bonds][0] if other_bonds.any() else None
+            directions = get_free_directions(bond_vectors, get_number_domains(bond_orders, bond_vectors), reference)
+
+        if len(acceptor_vectors) > 0 and len(directions) > number_hydrogens:
+            acceptor_units = acceptor_vectors / np.linalg.norm(acceptor_vectors, axis=1)[:, None]
+            scores = (directions @ acceptor_units.T).max(axis=1)
+            directions = directions[np.argsort(-scores, kind='stable')]
+
+        for direction in directions:
+            positions.append(cart_coords[index] + HYDROGEN_BOND_LENGTHS[symbol] * direction)
+            parents.append(index)
+        quotas[index] = number_hydrogens
+
+    return filter_hydrogen_sites(structure, np.array(positions).reshape(-1, 3), np.array(parents, dtype=int), quotas)
+
+
+def filter_hydrogen_sites(structure, positions, parents, quotas):
+    """Select the hydrogen sites of each atom in order, skipping those too close to another atom or a selected site.
+
+    :param positions: the Cartesian coordinates of the candidate hydrogen sites, ranked for each atom.
+    :param parents: the indices of the atoms the candidate sites are bonded to.
+    :param quotas: dictionary with the number of hydrogens of each atom.
+    :return: tuple with the fractional coordinates of the selected sites and the indices of their parents.
+    """
+    frac_coords = structure.lattice.get_fractional_coords(positions)
+    keep = []
+
+    for index, (position, parent) in enumerate(zip(frac_coords, parents)):
+        if np.sum(parents[keep] == parent) == quotas[parent]:
+            continue
+        distances = structure.lattice.get_all_distances(position, structure.frac_coords)[0]
+        distances[parent] = np.inf
+        if distances.min() < MIN_DISTANCE:
+            continue
+        if keep and structure.lattice.get_all_distances(position, frac_coords[keep]).min() < MIN_DISTANCE:
+            continue
+        keep.append(index)
+
+    return frac_coords[keep], parents[keep]
+
+
+def validate_geometric_sites(value, _):
+    """Validate the `geometric_sites` input of the restoration work chains."""
+    if value is not None and value.value not in ('seed', 'crosscheck'):
+        return f'`geometric_sites` should be `seed` or `crosscheck`, not `{value.value}`.'
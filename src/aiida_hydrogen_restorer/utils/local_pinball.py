@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Local combinatorial search of the subset of candidate sites that minimises a cheap model of the proton energy."""
+
+import numpy as np
+from pymatgen.analysis.ewald import EwaldSummation
+from pymatgen.core import Structure
+
+# Prefactor in eV and decay length in Angstrom of the short-range repulsion between two protons
+REPULSION_PREFACTOR = 500.0
+REPULSION_LENGTH = 0.25
+
+# Distance in Angstrom below which two protons cannot both be placed
+MIN_PROTON_DISTANCE = 1.0
+
+
+def get_interaction_matrix(lattice, positions):
+    """Return the matrix of interaction energies in eV between protons at the given fractional positions.
+
+    The interaction is the periodic Coulomb energy from an Ewald summation, with a uniform neutralising background,
+    plus a short-range exponential repulsion. Pairs that are closer than `MIN_PROTON_DISTANCE` get an infinite energy.
+    The diagonal holds the self energy of each proton.
+    """
+    protons = Structure(lattice, ['H'] * len(positions), positions)
+    protons.add_oxidation_state_by_element({'H': 1})
+    coulomb = EwaldSummation(protons).total_energy_matrix
+
+    distances = lattice.get_all_distances(positions, positions)
+    np.fill_diagonal(distances, np.inf)
+    repulsion = REPULSION_PREFACTOR * np.exp(-distances / REPULSION_LENGTH)
+
+    # The Ewald matrix sums to the total energy, so each pair appears twice with half of its energy
+    interactions = 2 * coulomb + repulsion
+    np.fill_diagonal(interactions, np.diag(coulomb))
+    interactions[distances < MIN_PROTON_DISTANCE] = np.inf
+
+    return interactions
+
+
+def search_best_subset(site_energies, interactions, number, orbits=None):
+    """Return the subset of `number` sites that minimises the total energy, by branch-and-bound.
+
+    The energy of a subset is the sum of the site energies and the diagonal of `interactions` of its sites, plus the
+    interactions of all its pairs. A branch is cut when a lower bound of its energy is above the best energy found. If
+    the symmetry `orbits` of the sites are given, only their representatives are tried as the first site, since every
+    subset is equivalent to one that starts with a representative.
+
+    :param site_energies: the energy in eV of a proton on each site.
+    :param interactions: the matrix of interaction energies in eV, see `get_interaction_matrix`.
+    :param number: the number of sites to choose.
+    :param orbits: the orbit label of each site, see `aiida_hydrogen_restorer.utils.symmetry.get_orbits`.
+    :return: tuple with the sorted indices of the best subset, its energy and the number of branches that were
+        explored.
+    """
+    number_sites = len(site_energies)
+    costs = np.asarray(site_energies) + np.diag(interactions)
+    pairs = interactions.copy()
+    np.fill_diagonal(pairs, 0.0)
+    min_pairs = np.where(np.eye(number_sites, dtype=bool), np.inf, pairs).min(axis=1, initial=np.inf)
+
+    best = {'subset': None, 'energy': np.inf, 'branches': 0}
+
+    def branch(subset, energy, added, start):
+        best['branches'] += 1
+        remaining = number - len(subset)
+
+        if remaining == 0:
+            if energy < best['energy']:
+                best['subset'], best['energy'] = list(subset), energy
+            return
+
+        candidates = np.arange(start, number_sites)
+        if len(candidates) < remaining:
+            return
+
+        increments = costs[candidates] + added[candidates]
+        bounds = increments + ((remaining - 1) / 2 * min_pairs[candidates] if remaining > 1 else 0.0)
+        if energy + np.sort(bounds)[:remaining].sum() >= best['energy']:
+            return
+
+        order = np.argsort(increments, kind='stable')
+        if not subset and orbits is not None:
+            order = order[orbits[candidates[order]] == candidates[order]]
+
+        for index, increment in zip(candidates[order], increments[order]):
+            if number_sites - index < remaining or not np.isfinite(increment):
+                continue
+            branch(subset + [index], energy + increment, added + pairs[index], index + 1)
+
+    branch([], 0.0, np.zeros(number_sites), 0)
+
+    subset = None if best['subset'] is None else [int(index) for index in best['subset']]
+
+    return subset, float(best['energy']), best['branches']
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Utilities to partition the candidate peaks of a pinball search into independent chunks."""
+
+import numpy as np
+
+from aiida_hydrogen_restorer.utils.symmetry import get_orbits
+
+
+def merge_small_chunks(chunks, min_size):
+    """Merge each chunk with fewer than `min_size` candidates into the next one, in order.
+
+    :param chunks: list of arrays of candidate indices.
+    :return: list of arrays of candidate indices, all with at least `min_size` candidates unless there is only one.
+    """
+    merged = []
+
+    for chunk in chunks:
+        if merged and len(merged[-1]) < min_size:
+            merged[-1] = np.concatenate([merged[-1], chunk])
+        else:
+            merged.append(np.asarray(chunk))
+
+    if len(merged) > 1 and len(merged[-1]) < min_size:
+        merged[-2] = np.concatenate([merged[-2], merged.pop()])
+
+    return merged
+
+
+def partition_by_orbit(structure, positions, values, number_chunks, min_size):
+    """Partition the candidates in chunks of whole symmetry orbits, balancing the number of candidates per chunk.
+
+    The orbits are assigned by decreasing value of their highest peak to the chunk with the fewest candidates.
+    """
+    orbits = get_orbits(structure, positions)
+    labels = sorted(np.unique(orbits), key=lambda label: -values[orbits == label].max())
+    chunks = [[] for _ in range(number_chunks)]
+
+    for label in labels:
+        min(chunks, key=len).extend(np.flatnonzero(orbits == label))
+
+    return merge_small_chunks([np.array(chunk, dtype=int) for chunk in chunks if chunk], min_size)
+
+
+def partition_by_region(structure, positions, number_chunks, min_size):
+    """Partition the candidates in slabs of equal thickness along the longest cell vector."""
+    axis = int(np.argmax(structure.lattice.abc))
+    slabs = np.floor(np.mod(positions[:, axis], 1.0) * number_chunks).astype(int)
+    chunks = [np.flatnonzero(slabs == slab) for slab in range(number_chunks)]
+
+    return merge_small_chunks([chunk for chunk in chunks if len(chunk) > 0], min_size)
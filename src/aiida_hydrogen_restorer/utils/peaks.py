@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Numerical routines to find the peaks of the potential on a periodic grid."""
+
+import itertools
+
+import numpy as np
+from skimage.feature.peak import peak_local_max
+
+# Minimum distance in grid points between two peaks when the periodic images of the grid are taken into account
+MIN_DISTANCE = 3
+
+
+def find_peaks(potential, do_supercell=True):
+    """Find the local maxima of the potential, sorted by decreasing value.
+
+    If `do_supercell` is True, the periodic images of the grid are taken into account to also find the peaks close to a
+    cell edge. Instead of searching a 3x3x3 supercell, the grid is only padded periodically with the width of the
+    peak neighbourhood, which gives the same peaks for a fraction of the memory and time.
+
+    :param potential: the potential on a 3D grid.
+    :param do_supercell: whether to take the periodic images of the grid into account.
+    :return: tuple with the array of grid indices of the peaks and the array of their values.
+    """
+    if do_supercell:
+        min_distance = MIN_DISTANCE
+        padded_potential = np.pad(potential, min_distance + 1, mode='wrap')
+        peak_locations = peak_local_max(padded_potential, min_distance=min_distance, exclude_border=False)
+
+        # Only keep the peaks in the original cell, and shift them back to its grid indices
+        peak_locations = peak_locations - (min_distance + 1)
+        cell_mask = ((peak_locations >= 0) & (peak_locations < potential.shape)).all(axis=1)
+        peak_locations = peak_locations[cell_mask, :]
+    else:
+        peak_locations = peak_local_max(potential, min_distance=1, exclude_border=False)
+
+    peak_values = potential[tuple(peak_locations.T)]
+
+    return peak_locations, peak_values
+
+
+def filter_equivalent_peaks(peak_locations, peak_values, equiv_peak_threshold):
+    """Filter the peaks down to those with a value within the `equiv_peak_threshold` ratio of the largest one."""
+    equiv_peak_mask = peak_values > peak_values[0] * equiv_peak_threshold
+
+    return peak_locations[equiv_peak_mask], peak_values[equiv_peak_mask]
+
+
+def get_changed_mask(potential, previous_potential, change_tolerance, min_distance=MIN_DISTANCE):
+    """Return the mask of the grid points where the potential changed with respect to the previous iteration.
+
+    The potentials are compared after subtracting their average, since the change of the total charge between
+    iterations shifts the whole potential. A grid point is considered changed if the difference is larger than
+    `change_tolerance` times the range of the potential. The mask is grown periodically by `min_distance` grid points,
+    so it also contains the neighbourhood of every changed point that could affect whether it is a peak.
+    """
+    difference = np.abs((potential - potential.mean()) - (previous_potential - previous_potential.mean()))
+    changed_mask = difference > change_tolerance * np.ptp(potential)
+
+    for axis in range(potential.ndim):
+        changed_mask = np.logical_or.reduce([
+            np.roll(changed_mask, offset, axis=axis) for offset in range(-min_distance, min_distance + 1)
+        ])
+
+    return changed_mask
+
+
+def get_neighbours(locations, offsets, shape, periodic=True):
+    """Return the grid indices of `locations` shifted by `offsets`, wrapped around the grid if `periodic` and else
+    clipped to its edges, like the `nearest` mode of the filters of `scipy.ndimage`."""
+    neighbours = locations + offsets
+
+    if periodic:
+        return np.mod(neighbours, shape)
+
+    return np.clip(neighbours, 0, np.array(shape) - 1)
+
+
+def is_local_max(potential, locations, min_distance, periodic=True):
+    """Return whether the potential at each of the grid `locations` is a maximum within `min_distance` grid points.
+
+    As in `find_peaks`, the grid points at the minimum of the potential are never maxima.
+    """
+    values = potential[tuple(locations.T)]
+    is_max = values > potential.min()
+
+    for offset in itertools.product(range(-min_distance, min_distance + 1), repeat=3):
+        neighbours = get_neighbours(locations, offset, potential.shape, periodic)
+        is_max &= values >= potential[tuple(neighbours.T)]
+
+    return is_max
+
+
+def refine_peaks(potential, locations, periodic=True):
+    """Move each of the grid `locations` uphill to the nearest local maximum of the potential, by steepest ascent."""
+    locations = np.array(locations, dtype=int).reshape(-1, 3)
+    offsets = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+
+    for _ in range(max(potential.shape)):
+        neighbours = get_neighbours(locations[:, None, :], offsets[None, :, :], potential.shape, periodic)
+        best = potential[tuple(np.moveaxis(neighbours, -1, 0))].argmax(axis=1)
+        new_locations = neighbours[np.arange(len(locations)), best]
+        if np.array_equal(new_locations, locations):
+            break
+        locations = new_locations
+
+    return locations
+
+
+def suppress_close_peaks(potential, locations, min_distance, periodic=True):
+    """Sort the peaks by decreasing value and remove those within `min_distance` grid points of a higher one."""
+    locations = np.unique(locations, axis=0)
+    values = potential[tuple(locations.T)]
+    order = np.argsort(-values, kind='stable')
+    locations, values = locations[order], values[order]
+    shape = np.array(potential.shape)
+
+    keep = []
+    for index, location in enumerate(locations):
+        distance = np.abs(locations[keep] - location)
+        distance = (np.minimum(distance, shape - distance) if periodic else distance).max(axis=1)
+        if not np.any(distance <= min_distance):
+            keep.append(index)
+
+    return locations[keep], values[keep]
+
+
+def update_peaks(
+    potential, previous_potential, previous_locations, change_tolerance, min_distance=MIN_DISTANCE, do_supercell=True
+):
+    """Update the peaks of the previous iteration for the new potential, instead of searching the whole grid again.
+
+    The peaks are only searched again where the potential changed beyond `change_tolerance`, see `get_changed_mask`.
+    The previous peaks outside of that region are moved to the nearest local maximum of the new potential, and only
+    kept if it is a maximum within `min_distance`, as for the peaks of `find_peaks`. The neighbourhoods are only wrapped
+    around the grid if `do_supercell` is True, so `min_distance` should be `MIN_DISTANCE` in that case and 1 otherwise
+    to find the same peaks as `find_peaks`. Falls back to a full search with `find_peaks` if the grids of the two
+    potentials differ.
+
+    :param potential: the new potential on a 3D grid.
+    :param previous_potential: the potential of the previous iteration, on the same grid.
+    :param previous_locations: the grid indices of all the peaks found in the previous iteration.
+    :param change_tolerance: the change of the potential, relative to its range, above which a grid point is searched.
+    :param min_distance: the minimum distance in grid points between two peaks.
+    :param do_supercell: whether to take the periodic images of the grid into account.
+    :return: tuple with the array of grid indices of the peaks and the array of their values, sorted by decreasing
+        value.
+    """
+    if potential.shape != previous_potential.shape:
+        return find_peaks(potential, do_supercell)
+
+    changed_mask = get_changed_mask(potential, previous_potential, change_tolerance, min_distance)
+
+    changed_locations = np.argwhere(changed_mask)
+    new_locations = changed_locations[is_local_max(potential, changed_locations, min_distance, do_supercell)]
+
+    previous_locations = np.array(previous_locations, dtype=int).reshape(-1, 3)
+    kept_locations = previous_locations[~changed_mask[tuple(previous_locations.T)]]
+    kept_locations = refine_peaks(potential, kept_locations, do_supercell)
+    kept_locations = kept_locations[is_local_max(potential, kept_locations, min_distance, do_supercell)]
+
+    return suppress_close_peaks(
+        potential, np.concatenate([new_locations, kept_locations]), min_distance, do_supercell
+    )
+
+
+def get_gap_threshold(peak_values, orbits, max_number):
+    """Return the equivalence threshold at the largest gap in the sorted peak values that does not split an orbit.
+
+    A cut after the first `k` peaks is allowed if `k` is at most `max_number` and no peak after the cut belongs to the
+    symmetry orbit of a peak before it. Among the allowed cuts, the one with the largest gap between the values of the
+    last peak kept and the first peak discarded is chosen. If no cut is allowed, the peaks of the first orbit are kept.
+
+    :param peak_values: the values of the peaks, sorted by decreasing value.
+    :param orbits: the orbit label of each peak, see `aiida_hydrogen_restorer.utils.symmetry.get_orbits`.
+    :param max_number: the maximum number of peaks to keep.
+    :return: the threshold to pass to `filter_equivalent_peaks`, as a ratio of the largest peak value.
+    """
+    if len(peak_values) < 2:
+        return 0.0
+
+    best_cut, best_gap = None, -np.inf
+
+    for cut in range(1, min(max_number, len(peak_values) - 1) + 1):
+        if np.intersect1d(orbits[:cut], orbits[cut:]).size > 0:
+            continue
+        gap = peak_values[cut - 1] - peak_values[cut]
+        if gap > best_gap:
+            best_cut, best_gap = cut, gap
+
+    if best_cut is None:
+        best_cut = int(np.sum(orbits == orbits[0]))
+
+    if best_cut >= len(peak_values):
+        return 0.0
+
+    return (peak_values[best_cut - 1] + peak_values[best_cut]) / 2 / peak_values[0]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Analytic models to update the potential on a periodic grid without a new calculation."""
+
+import numpy as np
+from qe_tools import CONSTANTS
+
+
+def get_reciprocal_grid(cell, shape):
+    """Return the squared norm of the reciprocal lattice vectors of a periodic grid, and their integer indices.
+
+    :param cell: the cell vectors, as rows.
+    :param shape: the shape of the grid.
+    :return: tuple with the array of squared norms, in the inverse squared unit of the cell, and the list of integer
+        index arrays along each axis.
+    """
+    reciprocal_cell = 2 * np.pi * np.linalg.inv(cell).T
+    indices = np.meshgrid(*[np.fft.fftfreq(size, 1 / size) for size in shape], indexing='ij')
+    vectors = sum(index[..., None] * reciprocal_vector for index, reciprocal_vector in zip(indices, reciprocal_cell))
+
+    return (vectors**2).sum(axis=-1), indices
+
+
+def get_proton_potential(cell, shape, positions, width):
+    """Return the electrostatic potential of protons with a Gaussian charge distribution on a periodic grid.
+
+    The potential is computed in reciprocal space as 8 pi / V exp(-G^2 sigma^2 / 2) / G^2 per proton, in Rydberg atomic
+    units, with a neutralising background so that the G = 0 term vanishes. The potential energy of an electron in the
+    field of the protons is the opposite.
+
+    :param cell: the cell vectors in Angstrom, as rows.
+    :param shape: the shape of the grid.
+    :param positions: the fractional coordinates of the protons.
+    :param width: the standard deviation of the Gaussian charge distribution, in Angstrom.
+    :return: the potential in Ry on the grid.
+    """
+    cell = np.asarray(cell) / CONSTANTS.bohr_to_ang
+    sigma = width / CONSTANTS.bohr_to_ang
+    volume = abs(np.linalg.det(cell))
+
+    norms, indices = get_reciprocal_grid(cell, shape)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kernel = 8 * np.pi / volume * np.exp(-norms * sigma**2 / 2) / norms
+    kernel[0, 0, 0] = 0.0
+
+    structure_factor = np.zeros(shape, dtype=complex)
+    for position in np.reshape(positions, (-1, 3)):
+        structure_factor += np.exp(-2j * np.pi * sum(index * coordinate for index, coordinate in zip(indices, position)))
+
+    return np.fft.ifftn(kernel * structure_factor).real * np.prod(shape)
+
+
+def add_protons_to_potential(potential, cell, positions, width):
+    """Return the potential seen by the electrons after adding protons at the given fractional `positions`.
+
+    This is a first-order prediction that neglects the response of the electrons, so it should only be used to place
+    the next hydrogens before the structure is checked with a new calculation.
+    """
+    return potential - get_proton_potential(cell, potential.shape, positions, width)
+
+
+def smooth_potential(potential, cell, width):
+    """Return the potential convolved with a periodic Gaussian, to remove the numerical noise before the peak search.
+
+    The convolution is computed in reciprocal space, so the periodicity of the grid is respected. The `width` should be
+    well below the distance between two hydrogen sites, e.g. a few tenths of an Angstrom, so no real peak is removed.
+
+    :param potential: the potential on a 3D grid.
+    :param cell: the cell vectors in Angstrom, as rows.
+    :param width: the standard deviation of the Gaussian, in Angstrom.
+    """
+    norms, _ = get_reciprocal_grid(np.asarray(cell), potential.shape)
+
+    return np.fft.ifftn(np.fft.fftn(potential) * np.exp(-norms * width**2 / 2)).real
+
+
+def crop_to_peaks(potential, locations, radius):
+    """Return the potential with every point further than `radius` grid points from all `locations` set to its minimum.
+
+    Only the neighbourhoods of the peaks are needed to place the hydrogens, so the rest of the grid is replaced by a
+    constant that compresses to almost nothing. The distances are taken along each grid axis and respect periodicity.
+
+    :param potential: the potential on a 3D grid.
+    :param locations: the grid indices of the peaks.
+    :param radius: the half width in grid points of the box that is kept around each peak.
+    """
+    mask = np.zeros(potential.shape, dtype=bool)
+    offsets = np.arange(-radius, radius + 1)
+
+    for location in np.reshape(locations, (-1, 3)):
+        indices = [np.mod(index + offsets, size) for index, size in zip(location, potential.shape)]
+        mask[np.ix_(*indices)] = True
+
+    return np.where(mask, potential, potential.min())
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Tabular report of the results of many restoration work chains, built from projected queries.
+
+Only the attributes that are needed are projected from the database, so no node is loaded and no structure is
+converted, which keeps the report fast for campaigns of many thousands of work chains.
+"""
+
+import csv
+import statistics
+
+from aiida import orm
+
+# Process labels of the work chains that are included in the report by default
+RESTORATION_PROCESS_LABELS = (
+    'RestoreHydrogenWorkChain',
+    'RestoreHydrogenPWorkChain',
+    'RestoreHydrogenWorkChainSimpler',
+    'RestorePietroWorkChain',
+    'RestoreHydrogenFragmentsWorkChain',
+)
+
+# Columns of the report, in order
+COLUMNS = (
+    'pk',
+    'uuid',
+    'process_label',
+    'process_state',
+    'exit_status',
+    'ctime',
+    'number_hydrogen',
+    'final_hydrogens',
+    'complete',
+    'initial_energy',
+    'wall_time',
+    'queue_time',
+    'core_hours',
+)
+
+
+def count_hydrogens_from_attributes(kinds, sites):
+    """Return the number of hydrogen sites from the `kinds` and `sites` attributes of a `StructureData`."""
+    hydrogen_kinds = {kind['name'] for kind in kinds if kind['symbols'] == ['H']}
+
+    return sum(1 for site in sites if site['kind_name'] in hydrogen_kinds)
+
+
+def get_output_values(pks, link_label, node_class, projections, with_incoming=True):
+    """Return a dictionary with the projected attributes of a linked node for each of the work chains `pks`.
+
+    :param link_label: the label of the link between the work chain and the node.
+    :param node_class: the class of the linked node.
+    :param projections: the projections of the linked node.
+    :param with_incoming: if True the node is an output of the work chain, otherwise an input.
+    """
+    query = orm.QueryBuilder()
+    query.append(orm.WorkflowNode, filters={'id': {'in': pks}}, project=['id'], tag='workchain')
+    relationship = {'with_incoming': 'workchain'} if with_incoming else {'with_outgoing': 'workchain'}
+    query.append(node_class, edge_filters={'label': link_label}, project=projections, **relationship)
+
+    return {pk: values for pk, *values in query.iterall()}
+
+
+def iter_restoration_rows(process_labels=RESTORATION_PROCESS_LABELS, page_size=1000):
+    """Yield a dictionary with the `COLUMNS` of each restoration work chain, in order of creation.
+
+    The work chains are queried in pages of `page_size`, and the inputs and outputs of each page are fetched with one
+    query per column, so the number of queries only grows with the number of pages.
+    """
+    last_pk = -1
+
+    while True:
+        query = orm.QueryBuilder()
+        query.append(
+            orm.WorkflowNode,
+            filters={'attributes.process_label': {'in': list(process_labels)}, 'id': {'>': last_pk}},
+            project=['id', 'uuid', 'attributes.process_label', 'attributes.process_state', 'attributes.exit_status',
+                     'ctime'],
+        )
+        query.order_by({orm.WorkflowNode: {'id': 'asc'}})
+        query.limit(page_size)
+        page = query.all()
+
+        if not page:
+            return
+
+        pks = [row[0] for row in page]
+        last_pk = pks[-1]
+
+        number_hydrogen = get_output_values(pks, 'number_hydrogen', orm.Int, ['attributes.value'], False)
+        final_structure = get_output_values(pks, 'final_structure', orm.StructureData,
+                                            ['attributes.kinds', 'attributes.sites'])
+        initial_energy = get_output_values(pks, 'initial_energy', orm.Float, ['attributes.value'])
+        timings = get_output_values(pks, 'timings', orm.Dict, ['attributes.total'])
+
+        for pk, uuid, process_label, process_state, exit_status, ctime in page:
+            row = dict.fromkeys(COLUMNS)
+            row.update({
+                'pk': pk,
+                'uuid': uuid,
+                'process_label': process_label,
+                'process_state': process_state,
+                'exit_status': exit_status,
+                'ctime': ctime.isoformat(),
+            })
+            if pk in number_hydrogen:
+                row['number_hydrogen'] = number_hydrogen[pk][0]
+            if pk in final_structure:
+                row['final_hydrogens'] = count_hydrogens_from_attributes(*final_structure[pk])
+            if row['number_hydrogen'] is not None and row['final_hydrogens'] is not None:
+                row['complete'] = row['final_hydrogens'] == row['number_hydrogen']
+            if pk in initial_energy:
+                row['initial_energy'] = initial_energy[pk][0]
+            if pk in timings and timings[pk][0]:
+                row.update({key: timings[pk][0].get(key) for key in ('wall_time', 'queue_time', 'core_hours')})
+            yield row
+
+
+def get_summary(rows):
+    """Return the success rates and timings of each work chain class, i.e. each restoration strategy.
+
+    A work chain is successful if it finished with exit status zero, and complete if its final structure has the
+    expected number of hydrogens.
+    """
+    groups = {}
+
+    for row in rows:
+        groups.setdefault(row['process_label'], []).append(row)
+
+    summary = []
+
+    for process_label, group in sorted(groups.items()):
+        wall_times = [row['wall_time'] for row in group if row['wall_time'] is not None]
+        core_hours = [row['core_hours'] for row in group if row['core_hours'] is not None]
+        summary.append({
+            'process_label': process_label,
+            'count': len(group),
+            'success_rate': sum(row['exit_status'] == 0 for row in group) / len(group),
+            'complete_rate': sum(bool(row['complete']) for row in group) / len(group),
+            'median_wall_time': statistics.median(wall_times) if wall_times else None,
+            'total_core_hours': sum(core_hours),
+        })
+
+    return summary
+
+
+def write_rows(rows, filename):
+    """Write the rows to a Parquet file if `filename` ends with `.parquet`, which requires `pandas`, or else to CSV.
+
+    :return: the number of rows that were written.
+    """
+    if str(filename).endswith('.parquet'):
+        try:
+            import pandas
+        except ImportError as exception:
+            message = 'writing Parquet requires `pandas` and `pyarrow`, install them with the `export` extra.'
+            raise ImportError(message) from exception
+
+        rows = list(rows)
+        pandas.DataFrame(rows, columns=list(COLUMNS)).to_parquet(filename, index=False)
+        return len(rows)
+
+    number_rows = 0
+
+    with open(filename, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.DictWriter(handle, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            number_rows += 1
+
+    return number_rows
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Utilities to resume a restoration work chain from the last good iteration of a previous run."""
+
+from aiida.common.links import LinkType
+
+
+def get_called_processes(node):
+    """Return the processes called by a restoration work chain, grouped by the step that launched them.
+
+    The call link label is used to recognise the step. For runs that did not set call link labels the step is guessed
+    from the process: the first `PwBaseWorkChain` is the reference SCF, and the relaxations are recognised from their
+    `calculation` parameter.
+
+    :return: dictionary that maps `initial_scf`, `scf`, `pp`, `relax` and `pinball` onto lists of process nodes,
+        sorted by creation time.
+    """
+    called = {'initial_scf': [], 'scf': [], 'pp': [], 'relax': [], 'pinball': []}
+    links = node.base.links.get_outgoing(link_type=(LinkType.CALL_CALC, LinkType.CALL_WORK)).all()
+
+    for link in sorted(links, key=lambda link: link.node.ctime):
+        process = link.node
+
+        if link.link_label in called:
+            step = link.link_label
+        elif process.process_label == 'PpCalculation':
+            step = 'pp'
+        elif process.process_label == 'PynballCalculation':
+            step = 'pinball'
+        elif process.process_label != 'PwBaseWorkChain':
+            continue
+        elif process.inputs.pw.parameters['CONTROL'].get('calculation', 'scf') == 'relax':
+            step = 'relax'
+        elif not called['initial_scf']:
+            step = 'initial_scf'
+        else:
+            step = 'scf'
+
+        called[step].append(process)
+
+    return called
+
+
+def get_last_peaks(node):
+    """Return the `all_peaks` and the potential of the last finished hydrogen placement of a restoration, if any.
+
+    The placements of the previous runs are followed through the `restart_from` input, so a chain of restarts keeps the
+    peaks of the last run that placed hydrogens.
+
+    :return: tuple with the `all_peaks` `ArrayData` and the potential `ArrayData` it was found in, or two None.
+    """
+    links = node.base.links.get_outgoing(link_type=LinkType.CALL_CALC).all()
+    placements = [
+        link.node for link in links
+        if link.node.process_label == 'add_hydrogens_to_structure' and link.node.is_finished_ok
+    ]
+
+    if placements:
+        placement = max(placements, key=lambda placement: placement.ctime)
+        return placement.outputs.all_peaks, placement.inputs.potential_array
+
+    if 'all_peaks' in node.outputs:
+        return node.outputs.all_peaks, None
+
+    if 'restart_from' in node.inputs:
+        return get_last_peaks(node.inputs.restart_from)
+
+    return None, None
+
+
+def get_restart_state(node):
+    """Return the state from which a restoration can be resumed after a previous run failed.
+
+    If the last relaxation failed, the restoration is resumed by relaxing the structure it was given again. If it
+    finished, the restoration is resumed by computing the potential of its output structure. If no relaxation was run
+    but the SCF finished, the restoration is resumed by computing the potential of the SCF.
+
+    :param node: the node of the previous restoration work chain.
+    :return: dictionary with the `step` to resume from (`scf`, `pp` or `relax`), the `structure` and `folder` to resume
+        with, the finished reference SCF `initial_scf`, and the `all_peaks` and `potential` of the last hydrogen
+        placement, if any of them are available.
+    """
+    called = get_called_processes(node)
+    finished = {step: [process for process in processes if process.is_finished_ok] for step, processes in called.items()}
+
+    state = {
+        'step': 'scf',
+        'structure': None,
+        'folder': None,
+        'initial_scf': finished['initial_scf'][-1] if finished['initial_scf'] else None,
+    }
+    state['all_peaks'], state['potential'] = get_last_peaks(node)
+
+    if finished['relax']:
+        state['folder'] = finished['relax'][-1].outputs.remote_folder
+    elif finished['scf']:
+        state['folder'] = finished['scf'][-1].outputs.remote_folder
+
+    if called['relax'] and not called['relax'][-1].is_finished_ok:
+        state['step'] = 'relax'
+        state['structure'] = called['relax'][-1].inputs.pw.structure
+    elif called['relax']:
+        state['step'] = 'pp'
+        state['structure'] = called['relax'][-1].outputs.output_structure
+    elif finished['scf']:
+        state['step'] = 'pp'
+        state['structure'] = finished['scf'][-1].inputs.pw.structure
+
+    return state
+
+
+def get_builder_restart_from(node):
+    """Return a builder to resume a failed restoration work chain from its last good iteration."""
+    builder = node.get_builder_restart()
+    builder.restart_from = node
+    return builder
+
+
+def submit_restarts(nodes):
+    """Resume every failed restoration work chain of a batch from its last good iteration.
+
+    The work chains that finished successfully or are still running are skipped.
+
+    :param nodes: iterable of restoration work chain nodes.
+    :return: dictionary that maps the pk of each failed work chain onto the node of the work chain that resumes it.
+    """
+    from aiida.engine import submit
+
+    restarts = {}
+
+    for node in nodes:
+        if not node.is_terminated or node.is_finished_ok:
+            continue
+        restarts[node.pk] = submit(get_builder_restart_from(node))
+
+    return restarts
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Lightweight summary of a `StructureData`, for bookkeeping that does not need a pymatgen `Structure`.
+
+The work chains count the hydrogens of their current structure in almost every step. Converting the node to a pymatgen
+`Structure` for this builds every site, so the counts are instead read directly from the `kinds` and `sites`
+attributes, and the summary of a stored node, which can no longer change, is cached by its UUID.
+"""
+
+import collections
+
+# Maximum number of summaries of stored structures kept in the cache
+SUMMARY_CACHE_SIZE = 256
+
+StructureSummary = collections.namedtuple('StructureSummary', ['element_counts', 'number_sites'])
+
+_SUMMARY_CACHE = collections.OrderedDict()
+
+
+def build_structure_summary(structure_data):
+    """Return the `StructureSummary` of a `StructureData` from its attributes.
+
+    The `element_counts` maps each element to its number of sites, with the sites of a kind with several symbols
+    counted by their weights.
+    """
+    kinds = {kind['name']: kind for kind in structure_data.base.attributes.get('kinds', [])}
+    sites = structure_data.base.attributes.get('sites', [])
+    element_counts = collections.Counter()
+
+    for site in sites:
+        kind = kinds[site['kind_name']]
+        for symbol, weight in zip(kind['symbols'], kind['weights']):
+            element_counts[symbol] += weight
+
+    return StructureSummary(dict(element_counts), len(sites))
+
+
+def get_structure_summary(structure_data):
+    """Return the `StructureSummary` of a `StructureData`, cached by UUID if the node is stored."""
+    if not structure_data.is_stored:
+        return build_structure_summary(structure_data)
+
+    uuid = structure_data.uuid
+
+    if uuid in _SUMMARY_CACHE:
+        _SUMMARY_CACHE.move_to_end(uuid)
+        return _SUMMARY_CACHE[uuid]
+
+    summary = build_structure_summary(structure_data)
+    _SUMMARY_CACHE[uuid] = summary
+
+    if len(_SUMMARY_CACHE) > SUMMARY_CACHE_SIZE:
+        _SUMMARY_CACHE.popitem(last=False)
+
+    return summary
+
+
+def count_hydrogens(structure_data):
+    """Return the number of hydrogens of a `StructureData`."""
+    return int(round(get_structure_summary(structure_data).element_counts.get('H', 0)))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Utilities to group positions in a structure by the symmetry operations of its space group."""
+
+import numpy as np
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+# Distance in Angstrom below which the image of a position under a symmetry operation is considered to coincide
+ORBIT_TOLERANCE = 0.3
+
+
+def get_orbits(structure, positions, symprec=0.1, tolerance=ORBIT_TOLERANCE):
+    """Return the label of the symmetry orbit of each position in a structure.
+
+    Two positions belong to the same orbit if a symmetry operation of the structure maps one onto the other within
+    `tolerance`. The label of an orbit is the index of its first position.
+
+    :param structure: pymatgen `Structure`.
+    :param positions: the fractional coordinates of the positions.
+    :return: array with the orbit label of each position.
+    """
+    positions = np.reshape(positions, (-1, 3))
+    labels = np.full(len(positions), -1)
+
+    if len(positions) == 0:
+        return labels
+
+    operations = SpacegroupAnalyzer(structure, symprec=symprec).get_symmetry_operations(cartesian=False)
+
+    for index, position in enumerate(positions):
+        if labels[index] >= 0:
+            continue
+        images = np.array([operation.operate(position) for operation in operations])
+        equivalent = (structure.lattice.get_all_distances(images, positions) < tolerance).any(axis=0)
+        labels[equivalent & (labels < 0)] = index
+
+    return labels
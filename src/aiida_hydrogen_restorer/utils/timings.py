@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Utilities to record the time and resources spent in the steps of the restoration work chains."""
+
+import functools
+import time
+
+from aiida.engine import calcfunction
+from aiida import orm
+
+
+def timed_step(step):
+    """Decorate a work chain outline step to record its wall time in the `timings` context variable."""
+
+    @functools.wraps(step)
+    def wrapper(self, *args, **kwargs):
+        if 'timings' not in self.ctx:
+            self.ctx.timings = {'steps': {}, 'processes': [], 'iterations': []}
+
+        start = time.time()
+        try:
+            return step(self, *args, **kwargs)
+        finally:
+            record = self.ctx.timings['steps'].setdefault(step.__name__, {'calls': 0, 'wall_time': 0.0})
+            record['calls'] += 1
+            record['wall_time'] += time.time() - start
+
+    return wrapper
+
+
+def get_process_timings(node):
+    """Return the wall time, queue time and core-hours of all calculation jobs run by a process.
+
+    The scheduler information of each job is used when available, otherwise the wall time is estimated from the
+    creation and last modification time of the node.
+
+    :param node: the `ProcessNode` of a calculation job or a workflow.
+    :return: dictionary with the `wall_time` and `queue_time` in seconds and the `core_hours`.
+    """
+    calcjobs = [node] if isinstance(node, orm.CalcJobNode) else [
+        descendant for descendant in node.called_descendants if isinstance(descendant, orm.CalcJobNode)
+    ]
+    timings = {'wall_time': 0.0, 'queue_time': 0.0, 'core_hours': 0.0}
+
+    for calcjob in calcjobs:
+        job_info = calcjob.get_last_job_info()
+        resources = calcjob.get_option('resources') or {}
+        num_mpiprocs = resources.get('num_machines', 1) * resources.get('num_mpiprocs_per_machine', 1)
+
+        wall_time = (calcjob.mtime - calcjob.ctime).total_seconds()
+
+        if job_info is not None:
+            wall_time = job_info.wallclock_time_seconds or wall_time
+            num_mpiprocs = job_info.num_mpiprocs or num_mpiprocs
+            if job_info.submission_time and job_info.dispatch_time:
+                timings['queue_time'] += (job_info.dispatch_time - job_info.submission_time).total_seconds()
+
+        timings['wall_time'] += wall_time
+        timings['core_hours'] += wall_time * num_mpiprocs / 3600
+
+    return timings
+
+
+def record_process(ctx, step, node):
+    """Add the timings of a finished child process to the `timings` context variable."""
+    ctx.timings['processes'].append({
+        'step': step,
+        'pk': node.pk,
+        'process_label': node.process_label,
+        **get_process_timings(node),
+    })
+
+
+@calcfunction
+def get_timings(timings: orm.Dict) -> orm.Dict:
+    """Return the timings recorded in the context of a work chain as an output `Dict`."""
+    timings = timings.get_dict()
+    timings['total'] = {
+        key: sum(process[key] for process in timings['processes'])
+        for key in ('wall_time', 'queue_time', 'core_hours')
+    }
+    return orm.Dict(timings)
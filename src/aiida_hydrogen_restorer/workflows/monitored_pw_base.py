@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""`PwBaseWorkChain` for the relaxations that are stopped by the `hydrogen_restorer.relax` monitor."""
+
+from aiida.engine import ProcessHandlerReport, process_handler
+from aiida_quantumespresso.calculations.pw import PwCalculation
+from aiida_quantumespresso.workflows.pw.base import PwBaseWorkChain
+
+
+class MonitoredPwBaseWorkChain(PwBaseWorkChain):
+    """`PwBaseWorkChain` that does not restart a calculation stopped by its monitor.
+
+    The `PwBaseWorkChain` has no handler for the `STOPPED_BY_MONITOR` exit code, so a stalled relaxation would be
+    restarted once as an unhandled failure and stall again. It is instead stopped with `ERROR_STOPPED_BY_MONITOR`, and
+    the restoration work chains continue from the last structure of the stopped calculation.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Define the process specification."""
+        super().define(spec)
+        spec.exit_code(420, 'ERROR_STOPPED_BY_MONITOR',
+            message='The calculation was stopped by its monitor and is not restarted.')
+
+    @process_handler(priority=700, exit_codes=[PwCalculation.exit_codes.STOPPED_BY_MONITOR])
+    def handle_stopped_by_monitor(self, calculation):
+        """Stop the work chain if the calculation was stopped by its monitor, instead of restarting it."""
+        self.report(f'{calculation.process_label}<{calculation.pk}> was stopped by its monitor, not restarting it.')
+        return ProcessHandlerReport(True, self.exit_codes.ERROR_STOPPED_BY_MONITOR)
@@ -3,14 +3,24 @@
 
 from aiida.engine import ToContext, WorkChain, while_, if_, calcfunction
 from aiida import orm
-from aiida.common import AttributeDict
+from aiida.common import AttributeDict, timezone
 from aiida_pseudo.data.pseudo.upf import UpfData
 from aiida_quantumespresso.workflows.pw.base import PwBaseWorkChain
 from aiida_quantumespresso.calculations.pp import PpCalculation
 from qe_tools import CONSTANTS
 
 
-from aiida_hydrogen_restorer.calculations.add_hydrogens_to_structure import add_hydrogens_to_structure
+from aiida_hydrogen_restorer.calculations.add_hydrogens_to_structure import add_geometric_hydrogens, add_hydrogens_to_structure
+from aiida_hydrogen_restorer.calculations.primitive_structure import get_primitive_structure, map_hydrogens_to_structure
+from aiida_hydrogen_restorer.monitors import get_stopped_calculation
+from aiida_hydrogen_restorer.parsers.pp import get_pp_parser_name, validate_cropped_potential, validate_potential_storage
+from aiida_hydrogen_restorer.utils.budget import get_exceeded_budget, is_oscillating
+from aiida_hydrogen_restorer.utils.cleaning import clean_remote_folders
+from aiida_hydrogen_restorer.utils.hydrogen_sites import validate_geometric_sites
+from aiida_hydrogen_restorer.utils.restart import get_builder_restart_from, get_restart_state
+from aiida_hydrogen_restorer.utils.structure import count_hydrogens
+from aiida_hydrogen_restorer.utils.timings import get_timings, record_process, timed_step
+from aiida_hydrogen_restorer.workflows.monitored_pw_base import MonitoredPwBaseWorkChain
 
 @calcfunction
 def get_energy(energy):
@@ -37,20 +47,75 @@ class RestoreHydrogenWorkChain(WorkChain):
         spec.input('do_supercell', valid_type=orm.Bool, default=lambda: orm.Bool(True), help='If True a supercell 3x3x3 is created.')
         spec.input('equiv_peak_threshold', valid_type=orm.Float, default=lambda: orm.Float(0.995), help='Threshold for selecting maxima peaks.')
         spec.input('hydrogen_pseudo', valid_type=UpfData)
+        spec.input('peak_change_tolerance', valid_type=orm.Float, required=False,
+            help='If specified, the peaks of the previous iteration are only searched again where the potential changed '
+                 'by more than this fraction of its range, and refined locally elsewhere.')
+        spec.input('predictor_rounds', valid_type=orm.Int, required=False,
+            help='If larger than one, up to this number of rounds of hydrogens are placed after each potential calculation, '
+                 'updating the potential analytically with the Coulomb potential of the protons placed in each round.')
+        spec.input('smoothing_width', valid_type=orm.Float, required=False,
+            help='If specified, the potential is smoothed with a periodic Gaussian of this width in Angstrom before the '
+                 'peak search, to remove spurious maxima. It should stay well below the X-H bond lengths, e.g. 0.2-0.3.')
+        spec.input('basin_depth_ratio', valid_type=orm.Float, required=False,
+            help='If specified, the hydrogens are placed in the watershed basins of the potential with a depth of at least '
+                 'this ratio of the deepest one, instead of using `equiv_peak_threshold`.')
+        spec.input('auto_threshold', valid_type=orm.Bool, default=lambda: orm.Bool(False),
+            help='If True, the `equiv_peak_threshold` is chosen in each iteration at the largest gap in the peak values '
+                 'that does not split a symmetry orbit. The chosen value is stored in the `equiv_peak_threshold` array '
+                 'of the `all_peaks` output and in each iteration of the `timings` output.')
+        spec.input('proximity_tolerances', valid_type=orm.List, required=False,
+            help='Minimum distances in Angstrom between a new hydrogen and the existing sites, tried in order when all '
+                 'the peaks are too close to an existing site. By default only 0.5 Angstrom is tried.')
+        spec.input('geometric_sites', valid_type=orm.Str, required=False, validator=validate_geometric_sites,
+            help='Use the hydrogen sites proposed by the bonding geometry of the structure: with `seed` they are added to '
+                 'the structure before the first calculation, with `crosscheck` the hydrogens placed on the peaks of the '
+                 'potential are moved onto the nearest geometric site.')
+        spec.input('potential_storage', valid_type=orm.Str, default=lambda: orm.Str('full'),
+            validator=validate_potential_storage,
+            help='How the potential grids are stored: `full` as parsed, `compressed` in single precision and compressed, '
+                 '`cropped` also with everything but the neighbourhoods of the peaks replaced by a constant, which '
+                 'cannot be combined with `basin_depth_ratio`.')
         spec.input('clean_workdir', valid_type=orm.Bool, default=lambda: orm.Bool(False))
-        spec.output('all_peaks', valid_type=orm.ArrayData, help='List of the maxima peaks') 
+        spec.input('clean_intermediate', valid_type=orm.Bool, default=lambda: orm.Bool(False),
+            help='If True the remote folders are cleaned as soon as no later step needs them.')
+        spec.input('restart_from', valid_type=orm.WorkflowNode, required=False,
+            help='A previous run of this work chain that failed, which is resumed from its last good iteration.')
+        spec.input('monitor_interval', valid_type=orm.Int, required=False,
+            help='If specified, the relaxations are monitored every this many seconds and stopped once they stall. '
+                 'A relaxation stopped by its monitor is accepted with its last structure.')
+        spec.input('max_iterations', valid_type=orm.Int, required=False,
+            help='Maximum number of iterations of the restoration loop.')
+        spec.input('max_core_hours', valid_type=orm.Float, required=False,
+            help='Maximum number of core-hours spent by the child calculations before the restoration loop is stopped.')
+        spec.input('max_wallclock_seconds', valid_type=orm.Float, required=False,
+            help='Maximum wall time in seconds of the work chain before the restoration loop is stopped.')
+        spec.input('oscillation_window', valid_type=orm.Int, default=lambda: orm.Int(4),
+            help='Number of iterations over which the restoration loop is stopped if the number of peaks flips back and '
+                 'forth while at most one hydrogen is added per iteration. Values smaller than 3 disable the check.')
+        spec.input('reduce_to_primitive', valid_type=orm.Bool, default=lambda: orm.Bool(False),
+            help='If True the restoration is run on the primitive cell and the hydrogens are mapped back onto the input cell.')
+        spec.output('all_peaks', valid_type=orm.ArrayData, required=False, help='List of the maxima peaks')
         spec.output('final_structure', valid_type=orm.StructureData, help='The final structure.')
         spec.output('initial_energy', valid_type=orm.Float, help='The energy of the input structure with H.')
+        spec.output('timings', valid_type=orm.Dict, required=False,
+            help='Wall time of each step, timings and core-hours of each child process and a record of each iteration.')
 
+        spec.inputs.validator = validate_cropped_potential
 
         spec.outline(
             cls.setup,
-            cls.run_initial_scf,
-            cls.run_scf,
-            cls.inspect_scf,
-            cls.run_pp,
-            cls.inspect_pp,
-            cls.add_hydrogen,
+            if_(cls.should_run_initial_scf)(
+                cls.run_initial_scf,
+            ),
+            if_(cls.should_run_scf)(
+                cls.run_scf,
+                cls.inspect_scf,
+            ),
+            if_(cls.should_run_pp)(
+                cls.run_pp,
+                cls.inspect_pp,
+                cls.add_hydrogen,
+            ),
             while_(cls.should_add_hydrogens)(
                 cls.run_relax_hydrogens,
                 cls.inspect_relax,
@@ -58,8 +123,10 @@ class RestoreHydrogenWorkChain(WorkChain):
                 cls.inspect_pp,
                 cls.add_hydrogen,
                 ),
-            cls.run_relax_hydrogens, 
-            cls.inspect_relax,
+            if_(cls.should_run_final_relax)(
+                cls.run_relax_hydrogens,
+                cls.inspect_relax,
+            ),
             cls.results
         )
         spec.exit_code(401, 'ERROR_SUB_PROCESS_FAILED_SCF',
@@ -71,7 +138,13 @@ class RestoreHydrogenWorkChain(WorkChain):
         spec.exit_code(501, 'WARNING_FINAL_STRUCTURE_NOT_COMPLETE',
             message='the final obtained structure does not have the required number of hydrogen.')
         spec.exit_code(503, 'NEW_SITE_TOO_CLOSE_TO_EXISTING_ONE',
-            message='the final obtained structure does not have the required number of hydrogen.')
+            message='no hydrogen could be placed, since all the peaks are too close to an existing site.')
+        spec.exit_code(504, 'ERROR_MAPPING_TO_ORIGINAL_CELL',
+            message='the structure restored in the primitive cell could not be mapped back onto the input cell.')
+        spec.exit_code(505, 'ERROR_BUDGET_EXCEEDED',
+            message='the restoration loop was stopped because it exceeded its budget, the final structure is incomplete.')
+        spec.exit_code(506, 'ERROR_NO_PROGRESS',
+            message='the restoration loop was stopped because it oscillates, the final structure is incomplete.')
 
     @classmethod
     def get_builder_from_protocol(
@@ -122,17 +195,67 @@ class RestoreHydrogenWorkChain(WorkChain):
 
         return builder
 
+    @timed_step
     def setup(self):
         """Set up the initial context variables."""
         self.ctx.current_structure = self.inputs.structure
+        self.ctx.number_hydrogen = self.inputs.number_hydrogen
         self.ctx.current_folder = None
         self.ctx.failed_to_add_hydrogen = False
         self.ctx.all_peaks = None
         self.ctx.num_peaks = None
+        self.ctx.previous_potential = None
+        self.ctx.restart_step = 'scf'
+        self.ctx.stop_exit_code = None
+
+        if self.inputs.reduce_to_primitive:
+            results = get_primitive_structure(self.inputs.structure, self.inputs.number_hydrogen)
+            self.ctx.current_structure = results['primitive_structure']
+            self.ctx.number_hydrogen = results['number_hydrogen']
+            self.report(
+                f'running the restoration on a cell with {len(self.ctx.current_structure.sites)} sites '
+                f'instead of {len(self.inputs.structure.sites)}.'
+            )
+
+        if 'geometric_sites' in self.inputs and self.inputs.geometric_sites.value == 'seed':
+            self.ctx.current_structure = add_geometric_hydrogens(self.ctx.current_structure, self.ctx.number_hydrogen)
+            self.report(
+                f"seeded {count_hydrogens(self.ctx.current_structure)} hydrogens from the bonding "
+                'geometry of the structure.'
+            )
+
+        if 'restart_from' in self.inputs:
+            state = get_restart_state(self.inputs.restart_from)
+            self.ctx.restart_step = state['step']
+            self.ctx.current_structure = state['structure'] or self.ctx.current_structure
+            self.ctx.current_folder = state['folder']
+            self.ctx.all_peaks = state['all_peaks']
+            self.ctx.previous_potential = state['potential']
+            if state['initial_scf'] is not None:
+                self.ctx.workchain_scf_initialstructure = state['initial_scf']
+            self.report(f'resuming <{self.inputs.restart_from.pk}> from the `{state["step"]}` step.')
+
+    @classmethod
+    def get_builder_restart_from(cls, node):
+        """Return a builder to resume a failed run of this work chain from its last good iteration."""
+        return get_builder_restart_from(node)
 
+    def should_run_initial_scf(self):
+        """Check if the reference scf still has to be run."""
+        return 'workchain_scf_initialstructure' not in self.ctx
+
+    def should_run_scf(self):
+        """Check if the scf has to be run, i.e. the restoration is not resumed from a later step."""
+        return self.ctx.restart_step == 'scf'
+
+    def should_run_pp(self):
+        """Check if the potential has to be computed before entering the loop."""
+        return self.ctx.restart_step in ('scf', 'pp')
+
+    @timed_step
     def run_initial_scf(self):
         """Run the `PwBaseWorkChain` that calculations the energy for the reference structure."""
-        structure_uuid = self.ctx.current_structure.extras['uuid_original_structure_withH']
+        structure_uuid = self.inputs.structure.extras['uuid_original_structure_withH']
         structure = orm.load_node(uuid=structure_uuid)
 
         inputs = AttributeDict(self.exposed_inputs(PwBaseWorkChain, namespace='scf'))
@@ -143,11 +266,14 @@ class RestoreHydrogenWorkChain(WorkChain):
         
         inputs.pw.parameters = orm.Dict(parameters)
 
+        inputs.metadata.call_link_label = 'initial_scf'
+
         pw_base_node = self.submit(PwBaseWorkChain, **inputs)
         self.report(f'launching PwBaseWorkChain<{pw_base_node.pk}> for scf on the reference structure.')
 
         return ToContext(workchain_scf_initialstructure=pw_base_node)        
 
+    @timed_step
     def run_scf(self):
         """Run the `PwBaseWorkChain` that calculates the initial potential."""
         structure = self.ctx.current_structure
@@ -157,85 +283,152 @@ class RestoreHydrogenWorkChain(WorkChain):
 
         parameters = inputs.pw.parameters.get_dict()
         parameters['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - structure.get_pymatgen().composition['H']
+            self.ctx.number_hydrogen.value - count_hydrogens(structure)
         )
         inputs.pw.parameters = orm.Dict(parameters)
 
+        inputs.metadata.call_link_label = 'scf'
+
         pw_base_node = self.submit(PwBaseWorkChain, **inputs)
         self.report(f'launching PwBaseWorkChain<{pw_base_node.pk}> for initial scf.')
 
         return ToContext(workchain_scf=pw_base_node)
 
+    @timed_step
     def inspect_scf(self):
         """Inspect the results of the scf `PwBaseWorkChain`."""
         scf_workchain = self.ctx.workchain_scf
+        record_process(self.ctx, 'run_scf', scf_workchain)
 
         if not scf_workchain.is_finished_ok:
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_SCF
 
         self.ctx.current_folder = scf_workchain.outputs.remote_folder
 
+    @timed_step
     def run_pp(self):
         """Run the `PwBaseWorkChain` that calculations the initial potential."""
         inputs = AttributeDict(self.exposed_inputs(PpCalculation, namespace='pp'))
         inputs.parent_folder = self.ctx.current_folder
+        inputs.metadata.call_link_label = 'pp'
+
+        parser_name = get_pp_parser_name(self.inputs.potential_storage)
+        if parser_name is not None:
+            inputs.metadata.options.parser_name = parser_name
 
         pp_calc_node = self.submit(PpCalculation, **inputs)
         self.report(f'launching pp.x <{pp_calc_node.pk}> to find electrostatic potential.')
         
         return ToContext(pp_calculation=pp_calc_node)
 
+    @timed_step
     def inspect_pp(self):
         """Inspect the results of the `PpCalculation`"""
         pp_calculation = self.ctx.pp_calculation
-    
+        record_process(self.ctx, 'run_pp', pp_calculation)
+
         if not pp_calculation.is_finished_ok:
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PP
 
+    @timed_step
     def add_hydrogen(self):
         """Add hydrogen to the current structure."""
         structure = self.ctx.current_structure
         potential_array = self.ctx.pp_calculation.outputs.output_data
 
-        try:
-            results = add_hydrogens_to_structure(
-                structure, 
-                potential_array,
-                self.inputs.do_supercell,
-                self.inputs.equiv_peak_threshold,
-                self.inputs.number_hydrogen
-            )
-        except ValueError:
-            return self.exit_codes.NEW_SITE_TOO_CLOSE_TO_EXISTING_ONE
+        kwargs = {}
+        if 'peak_change_tolerance' in self.inputs and self.ctx.previous_potential is not None:
+            kwargs = {
+                'previous_potential': self.ctx.previous_potential,
+                'previous_peaks': self.ctx.all_peaks,
+                'change_tolerance': self.inputs.peak_change_tolerance,
+            }
+        for key in ('predictor_rounds', 'smoothing_width', 'basin_depth_ratio', 'proximity_tolerances'):
+            if key in self.inputs:
+                kwargs[key] = self.inputs[key]
+        if self.inputs.auto_threshold:
+            kwargs['auto_threshold'] = self.inputs.auto_threshold
+        if 'geometric_sites' in self.inputs and self.inputs.geometric_sites.value == 'crosscheck':
+            kwargs['geometric_sites'] = orm.Bool(True)
+
+        results = add_hydrogens_to_structure(
+            structure,
+            potential_array,
+            self.inputs.do_supercell,
+            self.inputs.equiv_peak_threshold,
+            self.ctx.number_hydrogen,
+            **kwargs
+        )
+        self.ctx.previous_potential = potential_array
         
         
-        if structure.get_pymatgen().composition['H'] == results['new_structure'].get_pymatgen().composition['H']:
+        previous_H = count_hydrogens(structure)
+        new_H = count_hydrogens(results['new_structure'])
+        self.ctx.timings['iterations'].append({
+            'iteration': len(self.ctx.timings['iterations']) + 1,
+            'peaks_found': len(results['all_peaks'].get_array('peak_values')),
+            'hydrogens_added': int(new_H - previous_H),
+            'hydrogens': int(new_H),
+            'equiv_peak_threshold': float(results['all_peaks'].get_array('equiv_peak_threshold')[0]),
+        })
+        self.clean_obsolete_folders(self.ctx.pp_calculation)
+
+        if previous_H == new_H:
             self.ctx.failed_to_add_hydrogen = True
             self.ctx.all_peaks = results['all_peaks']
+            if results['all_peaks'].get_array('proximity_blocked')[0]:
+                self.report('no hydrogen could be placed, since all the peaks are too close to an existing site.')
+                self.ctx.stop_exit_code = 'NEW_SITE_TOO_CLOSE_TO_EXISTING_ONE'
 
 
         else:
             self.ctx.current_structure = results['new_structure']
             self.ctx.all_peaks = results['all_peaks']
             self.ctx.num_peaks = len(results['all_peaks'].get_array('peak_values'))
-            current_H = self.ctx.current_structure.get_pymatgen().composition['H']
+            current_H = count_hydrogens(self.ctx.current_structure)
             self.report(
-                f'Now there are {current_H} out of {self.inputs.number_hydrogen.value} hydrogens '
+                f'Now there are {current_H} out of {self.ctx.number_hydrogen.value} hydrogens '
                 f'(I found {self.ctx.num_peaks} maxima).'
             )
 
     def should_add_hydrogens(self):
-        """Check if more hydrogens should be added to the structure."""
+        """Check if more hydrogens should be added to the structure, and the restoration is within its budget."""
         not_enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] != self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) != self.ctx.number_hydrogen.value
+        )
+        if not not_enough_hydrogen or self.ctx.failed_to_add_hydrogen == True:
+            return False
+
+        exceeded_budget = get_exceeded_budget(
+            self.ctx.timings,
+            (timezone.now() - self.node.ctime).total_seconds(),
+            **{
+                key: self.inputs[key].value
+                for key in ('max_iterations', 'max_core_hours', 'max_wallclock_seconds') if key in self.inputs
+            }
         )
-        return not_enough_hydrogen and not self.ctx.failed_to_add_hydrogen == True
+        if exceeded_budget is not None:
+            self.report(f'stopping the restoration loop: it {exceeded_budget}.')
+            self.ctx.stop_exit_code = 'ERROR_BUDGET_EXCEEDED'
+            return False
+
+        if is_oscillating(self.ctx.timings['iterations'], self.inputs.oscillation_window.value):
+            self.report('stopping the restoration loop: the number of peaks flips back and forth without progress.')
+            self.ctx.stop_exit_code = 'ERROR_NO_PROGRESS'
+            return False
+
+        return True
+
+    def should_run_final_relax(self):
+        """Check if the final relaxation has to be run, i.e. the restoration loop was not stopped early."""
+        return self.ctx.stop_exit_code is None
     
 
+    @timed_step
     def run_relax_hydrogens(self):
         """Run the relaxation for new structure."""
 
-        if self.ctx.failed_to_add_hydrogen == True or self.ctx.current_structure.get_pymatgen().composition['H'] == 0 : 
+        if self.ctx.failed_to_add_hydrogen == True or count_hydrogens(self.ctx.current_structure) == 0 : 
             pass
         else:
             inputs = AttributeDict(self.exposed_inputs(PwBaseWorkChain, namespace='scf'))
@@ -244,7 +437,7 @@ class RestoreHydrogenWorkChain(WorkChain):
             parameters = inputs.pw.parameters.get_dict()
             parameters['CONTROL']['calculation'] = 'relax'
             parameters['SYSTEM']['tot_charge'] = - (
-                self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H']
+                self.ctx.number_hydrogen.value - count_hydrogens(self.ctx.current_structure)
             )
             parameters['CONTROL']['nstep'] = 250
             parameters['IONS'] = {'ion_dynamics': 'damp'}
@@ -257,40 +450,75 @@ class RestoreHydrogenWorkChain(WorkChain):
                 for site in self.ctx.current_structure.sites
             ]
             inputs.pw.settings = orm.Dict(settings)
+            inputs.metadata.call_link_label = 'relax'
+            process_class = PwBaseWorkChain
+            if 'monitor_interval' in self.inputs:
+                inputs.pw.monitors = {'relax': orm.Dict({
+                    'entry_point': 'hydrogen_restorer.relax',
+                    'minimum_poll_interval': self.inputs.monitor_interval.value,
+                })}
+                process_class = MonitoredPwBaseWorkChain
 
-            running = self.submit(PwBaseWorkChain, **inputs)
+            running = self.submit(process_class, **inputs)
 
             self.report(f'launching PwBaseWorkChain<{running.pk}> for relaxation babay.')
 
             return ToContext(workchain_relax=running)
 
+    @timed_step
     def inspect_relax(self):
             
-            if self.ctx.failed_to_add_hydrogen == True or self.ctx.current_structure.get_pymatgen().composition['H'] == 0 : 
+            if self.ctx.failed_to_add_hydrogen == True or count_hydrogens(self.ctx.current_structure) == 0 : 
                 pass
             else: 
                 """Inspect the results of the relax calc"""
                 workchain_relax = self.ctx.workchain_relax
+                record_process(self.ctx, 'run_relax_hydrogens', workchain_relax)
+
+                relaxation = workchain_relax
 
                 if not workchain_relax.is_finished_ok:
-                    return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
-                
-                self.ctx.current_structure = workchain_relax.outputs.output_structure
-                self.ctx.current_folder = workchain_relax.outputs.remote_folder
+                    relaxation = get_stopped_calculation(workchain_relax)
+                    if relaxation is None:
+                        return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
+                    self.report(f'accepting the last structure of <{relaxation.pk}>, which was stopped by its monitor.')
 
+                self.clean_obsolete_folders(self.ctx.current_folder)
+                self.ctx.current_structure = relaxation.outputs.output_structure
+                self.ctx.current_folder = relaxation.outputs.remote_folder
+
+    @timed_step
     def results(self):
         """Add the results to the outputs."""
         structure=self.ctx.current_structure
         all_peaks = self.ctx.all_peaks
         energy = self.ctx.workchain_scf_initialstructure.outputs.output_parameters.get_dict()['energy']
         initial_energy = get_energy(energy)
+        record_process(self.ctx, 'run_initial_scf', self.ctx.workchain_scf_initialstructure)
+        self.clean_obsolete_folders(self.ctx.workchain_scf_initialstructure)
 
         self.ctx.enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] == self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) == self.ctx.number_hydrogen.value
         )
-        self.out('all_peaks', all_peaks)
+        if self.inputs.reduce_to_primitive:
+            try:
+                structure = map_hydrogens_to_structure(self.inputs.structure, structure, self.inputs.number_hydrogen)
+            except ValueError:
+                if self.ctx.enough_hydrogen:
+                    return self.exit_codes.ERROR_MAPPING_TO_ORIGINAL_CELL
+                self.report(
+                    'the incomplete structure could not be mapped back onto the input cell, so the `final_structure` '
+                    'output is the primitive cell.'
+                )
+
+        if all_peaks is not None:
+            self.out('all_peaks', all_peaks)
         self.out('final_structure', structure)
         self.out('initial_energy', initial_energy)
+        self.out('timings', get_timings(orm.Dict(self.ctx.timings)))
+
+        if self.ctx.stop_exit_code is not None:
+            return getattr(self.exit_codes, self.ctx.stop_exit_code)
 
         if self.ctx.enough_hydrogen:
             self.report('Good job!')
@@ -298,6 +526,16 @@ class RestoreHydrogenWorkChain(WorkChain):
             self.report('You need to change method.')
             return self.exit_codes.WARNING_FINAL_STRUCTURE_NOT_COMPLETE
 
+    def clean_obsolete_folders(self, *nodes):
+        """Clean the remote folders of the given nodes if `clean_intermediate=True` in the inputs."""
+        if not self.inputs.clean_intermediate.value:
+            return
+
+        cleaned_folders = clean_remote_folders(node for node in nodes if node is not None)
+
+        if cleaned_folders:
+            self.report(f"cleaned remote folders: {' '.join(map(str, cleaned_folders))}")
+
     def on_terminated(self):
         """Clean the working directories of all child calculations if `clean_workdir=True` in the inputs."""
         super().on_terminated()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Work chain to restore hydrogens to a molecular crystal, one symmetry-unique fragment at a time."""
+
+from aiida.engine import ToContext, WorkChain
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida_pseudo.data.pseudo.upf import UpfData
+from aiida_quantumespresso.workflows.pw.base import PwBaseWorkChain
+
+from aiida_hydrogen_restorer.calculations.fragments import assemble_fragments, extract_fragments
+from aiida_hydrogen_restorer.workflows.restore_hydrogen_simpler import RestoreHydrogenWorkChainSimpler
+
+
+class RestoreHydrogenFragmentsWorkChain(WorkChain):
+
+    @classmethod
+    def define(cls, spec):
+        """Define the process specification"""
+        super().define(spec)
+
+        spec.expose_inputs(RestoreHydrogenWorkChainSimpler, namespace='fragment',
+            exclude=('structure', 'number_hydrogen', 'hydrogen_pseudo'),
+            namespace_options={'help': 'Inputs for the restoration of each fragment in its box.'})
+        spec.expose_inputs(PwBaseWorkChain, namespace='relax',
+            exclude=('clean_workdir', 'pw.structure', 'pw.parent_folder'),
+            namespace_options={'help': 'Inputs for the `PwBaseWorkChain` for the final relaxation of the crystal.'})
+
+        spec.input('structure', valid_type=orm.StructureData, help='The input structure.')
+        spec.input('number_hydrogen', valid_type=orm.Int, help='Number of expected hydrogen in the structure.')
+        spec.input('fragment_number_hydrogen', valid_type=orm.Dict, required=False,
+            help='Number of expected hydrogen for each fragment formula, needed if the fragments are not all alike.')
+        spec.input('vacuum', valid_type=orm.Float, default=lambda: orm.Float(6.0),
+            help='Vacuum in Angstrom around each fragment in its box.')
+        spec.input('hydrogen_pseudo', valid_type=UpfData)
+        spec.output_namespace('fragments', valid_type=orm.StructureData, dynamic=True,
+            help='The restored symmetry-unique fragments.')
+        spec.output('final_structure', valid_type=orm.StructureData, help='The final structure.')
+
+        spec.outline(
+            cls.setup,
+            cls.run_fragments,
+            cls.inspect_fragments,
+            cls.assemble_fragments,
+            cls.run_relax_hydrogens,
+            cls.inspect_relax,
+            cls.results
+        )
+        spec.exit_code(403, 'ERROR_SUB_PROCESS_FAILED_RELAX',
+            message='the `relax` PwBaseWorkChain sub process failed')
+        spec.exit_code(404, 'ERROR_SUB_PROCESS_FAILED_FRAGMENT',
+            message='the restoration of one of the fragments failed')
+        spec.exit_code(504, 'ERROR_FRAGMENTATION_FAILED',
+            message='the structure could not be split into molecular fragments.')
+        spec.exit_code(505, 'ERROR_ASSEMBLING_FRAGMENTS',
+            message='the restored fragments could not be placed back in the crystal.')
+
+    @classmethod
+    def get_builder_from_protocol(
+        cls,
+        pw_code,
+        pp_code,
+        structure,
+        number_hydrogen,
+        protocol=None,
+        overrides=None,
+        **kwargs
+    ):
+        overrides = {} if overrides is None else overrides
+        base_inputs = PwBaseWorkChain.get_protocol_inputs(protocol, overrides.get('relax', None))
+        pseudo_family = orm.load_group(base_inputs.pop('pseudo_family'))
+
+        fragment_builder = RestoreHydrogenWorkChainSimpler.get_builder_from_protocol(
+            pw_code, pp_code, structure, number_hydrogen, protocol=protocol, overrides=overrides.get('fragment', None)
+        )
+        for key in ('structure', 'number_hydrogen', 'hydrogen_pseudo'):
+            fragment_builder.pop(key, None)
+
+        # The fragments are isolated molecules in a box, possibly charged during the restoration
+        kpoints = orm.KpointsData()
+        kpoints.set_kpoints_mesh([1, 1, 1])
+        fragment_builder.scf.pop('kpoints_distance', None)
+        fragment_builder.scf.kpoints = kpoints
+        parameters = fragment_builder.scf.pw.parameters.get_dict()
+        parameters['SYSTEM']['assume_isolated'] = 'mt'
+        fragment_builder.scf.pw.parameters = orm.Dict(parameters)
+
+        base_relax = PwBaseWorkChain.get_builder_from_protocol(
+            code=pw_code, structure=structure, protocol=protocol, overrides=overrides.get('relax', None)
+        )
+        base_relax['pw'].pop('structure', None)
+        base_relax.pop('clean_workdir', None)
+
+        builder = cls.get_builder()
+
+        builder.fragment = fragment_builder
+        builder.relax = base_relax
+        builder.structure = structure
+        builder.number_hydrogen = orm.Int(number_hydrogen)
+        builder.hydrogen_pseudo = pseudo_family.get_pseudo('H')
+
+        return builder
+
+    def setup(self):
+        """Split the structure into its symmetry-unique fragments."""
+        kwargs = {}
+        if 'fragment_number_hydrogen' in self.inputs:
+            kwargs['fragment_number_hydrogen'] = self.inputs.fragment_number_hydrogen
+
+        try:
+            results = extract_fragments(
+                self.inputs.structure,
+                self.inputs.number_hydrogen,
+                self.inputs.vacuum,
+                **kwargs
+            )
+        except ValueError as exception:
+            self.report(f'could not split the structure into fragments: {exception}')
+            return self.exit_codes.ERROR_FRAGMENTATION_FAILED
+
+        self.ctx.fragment_data = results.pop('fragment_data')
+        self.ctx.fragments = results
+        self.ctx.current_structure = None
+        self.report(
+            f'found {len(self.ctx.fragment_data["fragments"])} fragments, '
+            f'of which {len(self.ctx.fragments)} are symmetry-unique.'
+        )
+
+    def run_fragments(self):
+        """Run the restoration of all symmetry-unique fragments in parallel."""
+        running = {}
+
+        for key, fragment in self.ctx.fragments.items():
+            representative = self.ctx.fragment_data['representatives'][int(key.split('_')[-1])]
+
+            inputs = AttributeDict(self.exposed_inputs(RestoreHydrogenWorkChainSimpler, namespace='fragment'))
+            inputs.structure = fragment
+            inputs.number_hydrogen = orm.Int(representative['number_hydrogen'])
+            inputs.hydrogen_pseudo = self.inputs.hydrogen_pseudo
+
+            running[key] = self.submit(RestoreHydrogenWorkChainSimpler, **inputs)
+            self.report(f'launching RestoreHydrogenWorkChainSimpler<{running[key].pk}> for {representative["formula"]}.')
+
+        return ToContext(**running)
+
+    def inspect_fragments(self):
+        """Inspect the results of the fragment restorations."""
+        for key in self.ctx.fragments:
+            if not self.ctx[key].is_finished_ok:
+                return self.exit_codes.ERROR_SUB_PROCESS_FAILED_FRAGMENT
+
+    def assemble_fragments(self):
+        """Place the hydrogen of the restored fragments in the crystal."""
+        restored_fragments = {key: self.ctx[key].outputs.final_structure for key in self.ctx.fragments}
+
+        try:
+            self.ctx.current_structure = assemble_fragments(
+                self.inputs.structure, self.ctx.fragment_data, **restored_fragments
+            )
+        except ValueError:
+            return self.exit_codes.ERROR_ASSEMBLING_FRAGMENTS
+
+    def run_relax_hydrogens(self):
+        """Run the relaxation of the hydrogens in the reassembled crystal."""
+        inputs = AttributeDict(self.exposed_inputs(PwBaseWorkChain, namespace='relax'))
+        inputs.pw.structure = self.ctx.current_structure
+
+        parameters = inputs.pw.parameters.get_dict()
+        parameters['CONTROL']['calculation'] = 'relax'
+        parameters['CONTROL']['nstep'] = 250
+        parameters['IONS'] = {'ion_dynamics': 'damp'}
+        inputs.pw.parameters = orm.Dict(parameters)
+        inputs.pw.pseudos['H'] = self.inputs.hydrogen_pseudo
+
+        settings = inputs.pw.get('settings', {})
+        settings['FIXED_COORDS'] = [
+            [False, False, False] if site.kind_name == 'H' else [True, True, True]
+            for site in self.ctx.current_structure.sites
+        ]
+        inputs.pw.settings = orm.Dict(settings)
+
+        running = self.submit(PwBaseWorkChain, **inputs)
+
+        self.report(f'launching PwBaseWorkChain<{running.pk}> for the relaxation of the crystal.')
+
+        return ToContext(workchain_relax=running)
+
+    def inspect_relax(self):
+        """Inspect the results of the relax calc"""
+        workchain_relax = self.ctx.workchain_relax
+
+        if not workchain_relax.is_finished_ok:
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
+
+        self.ctx.current_structure = workchain_relax.outputs.output_structure
+
+    def results(self):
+        """Add the results to the outputs."""
+        for key in self.ctx.fragments:
+            self.out(f'fragments.{key}', self.ctx[key].outputs.final_structure)
+
+        self.out('final_structure', self.ctx.current_structure)
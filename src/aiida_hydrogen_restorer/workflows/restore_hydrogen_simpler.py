@@ -11,6 +11,7 @@ from qe_tools import CONSTANTS
 
 
 from aiida_hydrogen_restorer.calculations.add_hydrogens_to_structure import add_hydrogens_to_structure
+from aiida_hydrogen_restorer.utils.structure import count_hydrogens
 
 # @calcfunction
 # def get_energy(energy):
@@ -156,7 +157,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
 
         parameters = inputs.pw.parameters.get_dict()
         parameters['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - structure.get_pymatgen().composition['H']
+            self.inputs.number_hydrogen.value - count_hydrogens(structure)
         )
         inputs.pw.parameters = orm.Dict(parameters)
 
@@ -203,7 +204,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
             self.inputs.equiv_peak_threshold,
             self.inputs.number_hydrogen
         )
-        if structure.get_pymatgen().composition['H'] == results['new_structure'].get_pymatgen().composition['H']:
+        if count_hydrogens(structure) == count_hydrogens(results['new_structure']):
             self.ctx.failed_to_add_hydrogen = True
             self.ctx.all_peaks = results['all_peaks']
 
@@ -211,7 +212,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
             self.ctx.current_structure = results['new_structure']
             self.ctx.all_peaks = results['all_peaks']
             self.ctx.num_peaks = len(results['all_peaks'].get_array('peak_values'))
-            current_H = self.ctx.current_structure.get_pymatgen().composition['H']
+            current_H = count_hydrogens(self.ctx.current_structure)
             self.report(
                 f'Now there are {current_H} out of {self.inputs.number_hydrogen.value} hydrogens '
                 f'(I found {self.ctx.num_peaks} maxima).'
@@ -220,14 +221,14 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
     def should_add_hydrogens(self):
         """Check if more hydrogens should be added to the structure."""
         not_enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] != self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) != self.inputs.number_hydrogen.value
         )
         return not_enough_hydrogen and not self.ctx.failed_to_add_hydrogen == True
 
     def run_relax_hydrogens(self):
         """Run the relaxation for new structure."""
 
-        if self.ctx.failed_to_add_hydrogen == True or self.ctx.current_structure.get_pymatgen().composition['H'] == 0 : 
+        if self.ctx.failed_to_add_hydrogen == True or count_hydrogens(self.ctx.current_structure) == 0 : 
             pass
         else:
             inputs = AttributeDict(self.exposed_inputs(PwBaseWorkChain, namespace='scf'))
@@ -236,7 +237,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
             parameters = inputs.pw.parameters.get_dict()
             parameters['CONTROL']['calculation'] = 'relax'
             parameters['SYSTEM']['tot_charge'] = - (
-                self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H']
+                self.inputs.number_hydrogen.value - count_hydrogens(self.ctx.current_structure)
             )
             parameters['CONTROL']['nstep'] = 250
             parameters['IONS'] = {'ion_dynamics': 'damp'}
@@ -258,7 +259,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
 
     def inspect_relax(self):
             
-            if self.ctx.failed_to_add_hydrogen == True or self.ctx.current_structure.get_pymatgen().composition['H'] == 0 : 
+            if self.ctx.failed_to_add_hydrogen == True or count_hydrogens(self.ctx.current_structure) == 0 : 
                 pass
             else: 
                 """Inspect the results of the relax calc"""
@@ -278,7 +279,7 @@ class RestoreHydrogenWorkChainSimpler(WorkChain):
         #initial_energy = get_energy(energy)
 
         enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] == self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) == self.inputs.number_hydrogen.value
         )
         self.out('all_peaks', all_peaks)
         self.out('final_structure', structure)
@@ -12,6 +12,7 @@ from qe_tools import CONSTANTS
 
 
 from aiida_hydrogen_restorer.calculations.add_hydrogens_to_structure import add_hydrogens_to_structure
+from aiida_hydrogen_restorer.utils.structure import count_hydrogens
 
 @calcfunction
 def get_energy(energy):
@@ -182,7 +183,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
 
         parameters = inputs.pw.parameters.get_dict()
         parameters['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - structure.get_pymatgen().composition['H']
+            self.inputs.number_hydrogen.value - count_hydrogens(structure)
         )
         inputs.pw.parameters = orm.Dict(parameters)
 
@@ -233,7 +234,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
         except ValueError:
             return self.exit_codes.NEW_SITE_TOO_CLOSE_TO_EXISTING_ONE
         
-        if structure.get_pymatgen().composition['H'] == results['new_structure'].get_pymatgen().composition['H']:
+        if count_hydrogens(structure) == count_hydrogens(results['new_structure']):
             self.ctx.failed_to_add_hydrogen = True
             self.ctx.all_peaks = results['all_peaks']
 
@@ -241,7 +242,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
             self.ctx.current_structure = results['new_structure']
             self.ctx.all_peaks = results['all_peaks']
             self.ctx.num_peaks = len(results['all_peaks'].get_array('peak_values'))
-            current_H = self.ctx.current_structure.get_pymatgen().composition['H']
+            current_H = count_hydrogens(self.ctx.current_structure)
             self.report(
                 f'Now there are {current_H} out of {self.inputs.number_hydrogen.value} hydrogens '
                 f'(I found {self.ctx.num_peaks} maxima).'
@@ -250,7 +251,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
     def should_add_hydrogens(self):
         """Check if more hydrogens should be added to the structure."""
         not_enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] != self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) != self.inputs.number_hydrogen.value
         )
         return not_enough_hydrogen and not self.ctx.failed_to_add_hydrogen == True
 
@@ -261,7 +262,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
             inputs = AttributeDict(self.exposed_inputs(PynballCalculation, namespace='pinball'))
             inputs.parent_folder = self.ctx.current_folder # it should be the latest pw folder
             inputs.all_peaks = self.ctx.all_peaks
-            inputs.number_hydrogen = orm.Int(self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H'])
+            inputs.number_hydrogen = orm.Int(self.inputs.number_hydrogen.value - count_hydrogens(self.ctx.current_structure))
             pinball_calc_node = self.submit(PynballCalculation, **inputs)
             self.report(f'launching pinball.x <{pinball_calc_node.pk}>.')
         
@@ -297,7 +298,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
         parameters = inputs.pw.parameters.get_dict()
         parameters['CONTROL']['calculation'] = 'relax'
         parameters['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H']
+            self.inputs.number_hydrogen.value - count_hydrogens(self.ctx.current_structure)
         )
         parameters['CONTROL']['nstep'] = 250
         parameters['IONS'] = {'ion_dynamics': 'damp'}
@@ -339,7 +340,7 @@ class RestoreHydrogenPWorkChain(WorkChain):
         initial_energy = get_energy(energy)
 
         self.ctx.enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] == self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) == self.inputs.number_hydrogen.value
         )
         self.out('all_peaks', all_peaks)
         self.out('final_structure', structure)
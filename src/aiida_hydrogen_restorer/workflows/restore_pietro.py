@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """Work chain to restore hydrogens to an inputs structure."""
 
+import numpy as np
+
 from aiida.engine import ToContext, WorkChain, while_, calcfunction
 from aiida import orm
 from aiida.common import AttributeDict
@@ -9,11 +11,31 @@ from aiida_quantumespresso.workflows.pw.base import PwBaseWorkChain
 from aiida_quantumespresso.calculations.pp import PpCalculation
 
 from aiida_hydrogen_restorer.calculations.add_hydrogens_to_structure import add_hydrogens_to_structure
+from aiida_hydrogen_restorer.data.compressed_array import CompressedArrayData
+from aiida_hydrogen_restorer.parsers.pp import CROP_RADIUS, get_pp_parser_name, validate_potential_storage
+from aiida_hydrogen_restorer.utils.peaks import find_peaks
+from aiida_hydrogen_restorer.utils.potential import crop_to_peaks
+from aiida_hydrogen_restorer.utils.structure import count_hydrogens
 
 @calcfunction
-def subtract_potentials(array_1, array_2):
-    difference = array_1.get_array('data') - array_2.get_array('data') 
-    potential_difference = orm.ArrayData()
+def subtract_potentials(array_1, array_2, potential_storage=None):
+    """Return the difference of two potential grids, stored as requested by `potential_storage`.
+
+    The subtraction is a single vectorised operation on the whole grid. If the result is stored compressed, it is
+    computed directly in single precision, so no temporary double precision grid is allocated.
+    """
+    compressed = potential_storage is not None and potential_storage.value != 'full'
+    potential_1 = array_1.get_array('data')
+    potential_2 = array_2.get_array('data')
+
+    if potential_1.shape != potential_2.shape:
+        raise ValueError(f'the potential grids have different shapes {potential_1.shape} and {potential_2.shape}.')
+
+    difference = np.subtract(potential_1, potential_2, dtype=np.float32 if compressed else None)
+    potential_difference = CompressedArrayData() if compressed else orm.ArrayData()
+    if potential_storage is not None and potential_storage.value == 'cropped':
+        peak_locations, _ = find_peaks(difference)
+        difference = crop_to_peaks(difference, peak_locations, CROP_RADIUS)
     potential_difference.set_array('data', difference)
     return {'potential_difference': potential_difference}
 
@@ -37,6 +59,10 @@ class RestorePietroWorkChain(WorkChain):
         spec.input('do_supercell', valid_type=orm.Bool, default=lambda: orm.Bool(True), help='If True a supercell 3x3x3 is created.')
         spec.input('equiv_peak_threshold', valid_type=orm.Float, default=lambda: orm.Float(0.995), help='Threshold for selecting maxima peaks.')
         spec.input('hydrogen_pseudo', valid_type=UpfData)
+        spec.input('potential_storage', valid_type=orm.Str, default=lambda: orm.Str('full'),
+            validator=validate_potential_storage,
+            help='How the potential grids are stored: `full` as parsed, `compressed` in single precision and compressed, '
+                 '`cropped` also with everything but the neighbourhoods of the peaks replaced by a constant.')
         spec.input('clean_workdir', valid_type=orm.Bool, default=lambda: orm.Bool(False))
         spec.output('all_peaks', valid_type=orm.ArrayData, help='List of the maxima peaks')
         spec.output('final_structure', valid_type=orm.StructureData, help='The final structure.')
@@ -130,7 +156,7 @@ class RestorePietroWorkChain(WorkChain):
         full_inputs.pw.structure = structure
         parameters = full_inputs.pw.parameters.get_dict()
         parameters['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H']
+            self.inputs.number_hydrogen.value - count_hydrogens(self.ctx.current_structure)
         )
         full_inputs.pw.parameters = orm.Dict(parameters)
         if 'H' in structure.get_composition().keys():
@@ -143,7 +169,7 @@ class RestorePietroWorkChain(WorkChain):
         partial_inputs.pw.structure = structure
         partial_params = partial_inputs.pw.parameters.get_dict()
         partial_params['SYSTEM']['tot_charge'] = - (
-            self.inputs.number_hydrogen.value - self.ctx.current_structure.get_pymatgen().composition['H']
+            self.inputs.number_hydrogen.value - count_hydrogens(self.ctx.current_structure)
         ) + 1
         partial_inputs.pw.parameters = orm.Dict(partial_params)
         if 'H' in structure.get_composition().keys():
@@ -171,12 +197,19 @@ class RestorePietroWorkChain(WorkChain):
 
     def run_pp(self):
         """Run the `PwBaseWorkChain` that calculations the initial potential."""
+        # Both potentials are only compressed, since their difference is cropped to its own peaks in `add_hydrogen`
+        parser_name = get_pp_parser_name(orm.Str('compressed')) if self.inputs.potential_storage.value != 'full' else None
+
         full_inputs = AttributeDict(self.exposed_inputs(PpCalculation, namespace='pp'))
         full_inputs.parent_folder = self.ctx.current_full_folder
+        if parser_name is not None:
+            full_inputs.metadata.options.parser_name = parser_name
         pp_calc_full = self.submit(PpCalculation, **full_inputs)
 
         partial_inputs = AttributeDict(self.exposed_inputs(PpCalculation, namespace='pp'))
         partial_inputs.parent_folder = self.ctx.current_partial_folder
+        if parser_name is not None:
+            partial_inputs.metadata.options.parser_name = parser_name
         pp_calc_partial = self.submit(PpCalculation, **partial_inputs)
 
         self.report(
@@ -204,7 +237,8 @@ class RestorePietroWorkChain(WorkChain):
 
         potential_difference = subtract_potentials(
             array_1 = potential_array_full,
-            array_2 = potential_array_partial
+            array_2 = potential_array_partial,
+            potential_storage = self.inputs.potential_storage,
         )['potential_difference']
 
         results = add_hydrogens_to_structure(
@@ -214,13 +248,13 @@ class RestorePietroWorkChain(WorkChain):
             self.inputs.equiv_peak_threshold,
             self.inputs.number_hydrogen
         )
-        if structure.get_pymatgen().composition['H'] == results['new_structure'].get_pymatgen().composition['H']:
+        if count_hydrogens(structure) == count_hydrogens(results['new_structure']):
             self.ctx.failed_to_add_hydrogen = True
         else:
             self.ctx.current_structure = results['new_structure']
             self.ctx.all_peaks = results['all_peaks']
             self.ctx.num_peaks = len(results['all_peaks'].get_array('peak_values'))
-            current_H = self.ctx.current_structure.get_pymatgen().composition['H']
+            current_H = count_hydrogens(self.ctx.current_structure)
             self.report(
                 f'Now there are {current_H} out of {self.inputs.number_hydrogen.value} hydrogens '
                 f'(I found {self.ctx.num_peaks} maxima).'
@@ -229,7 +263,7 @@ class RestorePietroWorkChain(WorkChain):
     def should_add_hydrogens(self):
         """Check if more hydrogens should be added to the structure."""
         not_enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] != self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) != self.inputs.number_hydrogen.value
         )
         return not_enough_hydrogen and not self.ctx.failed_to_add_hydrogen == True
 
@@ -277,7 +311,7 @@ class RestorePietroWorkChain(WorkChain):
         structure=self.ctx.current_structure
         all_peaks = self.ctx.all_peaks
         enough_hydrogen = (
-            self.ctx.current_structure.get_pymatgen().composition['H'] == self.inputs.number_hydrogen.value
+            count_hydrogens(self.ctx.current_structure) == self.inputs.number_hydrogen.value
         )
         self.out('all_peaks', all_peaks)
         self.out('final_structure', structure)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+"""Fixtures for the tests of the `aiida-hydrogen-restorer` plugin."""
+pytest_plugins = ['aiida.manage.tests.pytest_fixtures']
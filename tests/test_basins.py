@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.utils.basins` module."""
+import numpy as np
+
+from aiida_hydrogen_restorer.utils.basins import distribute_hydrogens, select_basins
+
+
+def test_select_basins():
+    """Test that the basins at least `basin_depth_ratio` as deep as the deepest one are selected."""
+    depths = np.array([1.0, 0.9, 0.5, 0.2])
+
+    assert select_basins(depths, 0.8).tolist() == [True, True, False, False]
+
+
+def test_distribute_hydrogens():
+    """Test that the selected basins take hydrogens in proportion to their integrated values."""
+    depths = np.array([1.0, 0.9, 0.1])
+    integrals = np.array([2.0, 1.0, 5.0])
+
+    assert distribute_hydrogens(depths, integrals, 3, 0.5).tolist() == [2, 1, 0]
+    assert distribute_hydrogens(depths, integrals, 2, 0.5).tolist() == [1, 1, 0]
+
+
+def test_distribute_hydrogens_too_many_basins():
+    """Test that no hydrogen is placed if more basins are selected than hydrogens are missing."""
+    depths = np.array([1.0, 0.9, 0.8])
+
+    assert distribute_hydrogens(depths, np.ones(3), 2, 0.5).tolist() == [0, 0, 0]
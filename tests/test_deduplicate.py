@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.utils.deduplicate` module."""
+import pytest
+
+from aiida_hydrogen_restorer.utils.deduplicate import reduce_composition
+
+
+@pytest.mark.parametrize(('composition', 'expected'), (
+    ({'H': 4, 'O': 2}, (('H', 2), ('O', 1))),
+    ({'Na': 4, 'Cl': 4}, (('Cl', 1), ('Na', 1))),
+    ({'H': 4.0, 'O': 2.0}, (('H', 2), ('O', 1))),
+    ({'Ba': 1.5, 'Sr': 0.5, 'O': 4}, (('Ba', 3.0), ('O', 8.0), ('Sr', 1.0))),
+))
+def test_reduce_composition(composition, expected):
+    """Test the reduced composition, also with the fractional counts of mixed-occupancy kinds."""
+    assert reduce_composition(composition) == expected
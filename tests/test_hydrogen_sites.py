@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.utils.hydrogen_sites` module."""
+import numpy as np
+from pymatgen.core import Lattice, Structure
+import pytest
+
+from aiida_hydrogen_restorer.utils.hydrogen_sites import HYDROGEN_BOND_LENGTHS, get_free_directions, get_hydrogen_sites
+
+
+def get_carbon_pair(bond_length):
+    """Return a structure with two carbons at `bond_length` in a large cubic cell, i.e. a molecule without hydrogens."""
+    return Structure(
+        Lattice.cubic(12), ['C', 'C'], [[6, 6, 6], [6, 6, 6 + bond_length]], coords_are_cartesian=True
+    )
+
+
+@pytest.mark.parametrize(('bond_length', 'number_hydrogens'), ((1.20, 1), (1.34, 2), (1.54, 3)))
+def test_get_hydrogen_sites_hydrocarbons(bond_length, number_hydrogens):
+    """Test the hydrogens of acetylene, ethylene and ethane, whose hybridisation is set by the C-C bond length."""
+    structure = get_carbon_pair(bond_length)
+    frac_coords, parents = get_hydrogen_sites(structure)
+
+    assert np.bincount(parents, minlength=2).tolist() == [number_hydrogens, number_hydrogens]
+
+    distances = [structure.lattice.get_all_distances(site, structure[parent].frac_coords)[0, 0]
+                 for site, parent in zip(frac_coords, parents)]
+    assert np.allclose(distances, HYDROGEN_BOND_LENGTHS['C'])
+
+
+@pytest.mark.parametrize('number_domains', (2, 3, 4))
+def test_get_free_directions_no_bonds(number_domains):
+    """Test that an atom without bonds has one free direction for each of its electron domains."""
+    directions = get_free_directions([], number_domains)
+
+    assert directions.shape == (number_domains, 3)
+    assert np.allclose(np.linalg.norm(directions, axis=1), 1)
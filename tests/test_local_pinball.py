@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.utils.local_pinball` module."""
+import itertools
+
+import numpy as np
+import pytest
+
+from aiida_hydrogen_restorer.utils.local_pinball import search_best_subset
+
+
+def get_energy(site_energies, interactions, subset):
+    """Return the energy of a subset of sites, as defined in `search_best_subset`."""
+    subset = list(subset)
+    return site_energies[subset].sum() + interactions[np.ix_(subset, subset)][np.triu_indices(len(subset))].sum()
+
+
+@pytest.mark.parametrize(('number_sites', 'number'), ((6, 2), (8, 3), (9, 4)))
+@pytest.mark.parametrize('seed', range(5))
+def test_search_best_subset_brute_force(seed, number_sites, number):
+    """Test that the branch-and-bound search finds the same subset as a brute force search."""
+    rng = np.random.default_rng(seed)
+    site_energies = rng.normal(size=number_sites)
+    interactions = rng.normal(size=(number_sites, number_sites))
+    interactions = (interactions + interactions.T) / 2
+    interactions[0, 1] = interactions[1, 0] = np.inf
+
+    energies = {
+        subset: get_energy(site_energies, interactions, subset)
+        for subset in itertools.combinations(range(number_sites), number)
+    }
+    expected = min(energies, key=energies.get)
+
+    subset, energy, branches = search_best_subset(site_energies, interactions, number)
+
+    assert subset == list(expected)
+    assert energy == pytest.approx(energies[expected])
+    assert branches > 0
+
+
+def test_search_best_subset_no_subset():
+    """Test that no subset is returned if all the pairs of sites are forbidden."""
+    interactions = np.full((3, 3), np.inf)
+    np.fill_diagonal(interactions, 0.0)
+
+    subset, energy, _ = search_best_subset(np.zeros(3), interactions, 2)
+
+    assert subset is None
+    assert energy == np.inf
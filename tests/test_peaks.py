@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.utils.peaks` module."""
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from aiida_hydrogen_restorer.utils.peaks import MIN_DISTANCE, find_peaks, update_peaks
+
+SHAPE = (24, 24, 24)
+
+
+def get_potential(seed):
+    """Return a smooth random periodic potential on a grid of shape `SHAPE`."""
+    return gaussian_filter(np.random.default_rng(seed).normal(size=SHAPE), 2, mode='wrap')
+
+
+def get_peak_set(locations):
+    """Return the peak locations as a set of tuples."""
+    return {tuple(location) for location in locations}
+
+
+@pytest.mark.parametrize('do_supercell', (True, False))
+@pytest.mark.parametrize('seed', range(5))
+def test_update_peaks_matches_find_peaks(seed, do_supercell):
+    """Test that `update_peaks` finds the same peaks as `find_peaks` if the potential only changes in a region."""
+    previous_potential = get_potential(seed)
+    region = ((np.indices(SHAPE) - 12)**2).sum(axis=0) < 25
+    potential = previous_potential + 0.5 * np.ptp(previous_potential) * region
+    min_distance = MIN_DISTANCE if do_supercell else 1
+
+    previous_locations, _ = find_peaks(previous_potential, do_supercell)
+    expected, _ = find_peaks(potential, do_supercell)
+    locations, values = update_peaks(
+        potential, previous_potential, previous_locations, 0.05, min_distance, do_supercell
+    )
+
+    assert get_peak_set(locations) == get_peak_set(expected)
+    assert np.all(np.diff(values) <= 0)
+
+
+@pytest.mark.parametrize('do_supercell', (True, False))
+@pytest.mark.parametrize('seed', range(5))
+def test_update_peaks_no_spurious_peaks(seed, do_supercell):
+    """Test that all the peaks of `update_peaks` are found by `find_peaks` if the whole potential changes slightly."""
+    previous_potential = get_potential(seed)
+    potential = previous_potential + 0.05 * gaussian_filter(
+        np.random.default_rng(seed + 100).normal(size=SHAPE), 1, mode='wrap'
+    )
+    min_distance = MIN_DISTANCE if do_supercell else 1
+
+    previous_locations, _ = find_peaks(previous_potential, do_supercell)
+    expected, _ = find_peaks(potential, do_supercell)
+    locations, _ = update_peaks(potential, previous_potential, previous_locations, 0.05, min_distance, do_supercell)
+
+    assert get_peak_set(locations) <= get_peak_set(expected)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Tests for the `aiida_hydrogen_restorer.calculations.primitive_structure` module."""
+import numpy as np
+from pymatgen.core import Lattice, Structure
+import pytest
+
+from aiida import orm
+
+from aiida_hydrogen_restorer.calculations.primitive_structure import (
+    get_primitive_structure,
+    map_hydrogens_to_structure,
+)
+
+HYDROGEN_COORDS = [0.0, 0.0, 0.25]
+
+
+@pytest.fixture
+def primitive():
+    """Return a primitive cell with one magnesium and one oxygen."""
+    return Structure(Lattice.cubic(4.0), ['Mg', 'O'], [[0.5, 0.5, 0.5], [0.0, 0.0, 0.0]])
+
+
+@pytest.fixture
+def supercell(primitive):
+    """Return a 2x1x1 supercell of the primitive cell."""
+    return primitive * (2, 1, 1)
+
+
+@pytest.mark.usefixtures('aiida_profile')
+def test_get_primitive_structure(supercell):
+    """Test that the number of hydrogen is scaled to the primitive cell."""
+    results = get_primitive_structure(orm.StructureData(pymatgen=supercell), orm.Int(2))
+
+    assert len(results['primitive_structure'].sites) == 2
+    assert results['number_hydrogen'].value == 1
+
+
+@pytest.mark.usefixtures('aiida_profile')
+def test_get_primitive_structure_uneven(supercell):
+    """Test that the structure is kept if the hydrogens cannot be distributed evenly over the primitive cells."""
+    results = get_primitive_structure(orm.StructureData(pymatgen=supercell), orm.Int(3))
+
+    assert len(results['primitive_structure'].sites) == len(supercell)
+    assert results['number_hydrogen'].value == 3
+
+
+@pytest.mark.usefixtures('aiida_profile')
+def test_map_hydrogens_to_structure(primitive, supercell):
+    """Test that the hydrogens restored in the primitive cell are mapped onto each of its images in the supercell."""
+    restored = primitive.copy()
+    restored.append('H', HYDROGEN_COORDS)
+
+    result = map_hydrogens_to_structure(
+        orm.StructureData(pymatgen=supercell), orm.StructureData(pymatgen=restored), orm.Int(2)
+    ).get_pymatgen()
+
+    hydrogens = np.array([site.frac_coords for site in result if site.species_string == 'H'])
+    expected = supercell.lattice.get_fractional_coords(
+        [primitive.lattice.get_cartesian_coords(HYDROGEN_COORDS) + shift for shift in ([0, 0, 0], [4.0, 0, 0])]
+    )
+
+    assert len(result) == len(supercell) + 2
+    assert supercell.lattice.get_all_distances(hydrogens, expected).min(axis=0).max() < 1e-6
+
+
+@pytest.mark.usefixtures('aiida_profile')
+def test_map_hydrogens_to_structure_too_many(primitive, supercell):
+    """Test that mapping more hydrogens onto the supercell than it should have raises."""
+    restored = primitive.copy()
+    restored.append('H', HYDROGEN_COORDS)
+
+    with pytest.raises(ValueError):
+        map_hydrogens_to_structure(
+            orm.StructureData(pymatgen=supercell), orm.StructureData(pymatgen=restored), orm.Int(1)
+        )